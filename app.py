@@ -1,4 +1,14 @@
 # app.py
+import os
+from dotenv import load_dotenv
+
+# An async worker has to patch the standard library before anything else imports it
+load_dotenv()
+ASYNC_MODE = (os.getenv("SOCKETIO_ASYNC_MODE") or "").lower() or None  # eventlet or threading
+if ASYNC_MODE == "eventlet":
+    import eventlet
+    eventlet.monkey_patch()
+
 from itsdangerous import URLSafeTimedSerializer as Serializer
 from flask import url_for, jsonify
 from bson.objectid import ObjectId
@@ -11,17 +21,30 @@ import os
 import subprocess
 from dotenv import load_dotenv
 import sys
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
+from spotipy.oauth2 import SpotifyClientCredentials, SpotifyOAuth
 from flask_mail import Mail, Message
 from forms import RegistrationForm
-from flask_socketio import SocketIO, emit 
+from flask_socketio import SocketIO, emit, join_room 
 from werkzeug.utils import secure_filename
 import uuid 
+import base64
+import binascii
 import logging
 import cloudinary
 from cloudinary import uploader
 from cloudinary.utils import cloudinary_url
+from emotion_service import EmotionService
+from vitals_hub import VitalsHub
+from vitals_devices import DeviceRegistry, DevicePairingError
+from vitals_store import VitalsWriter, downsampled_vitals, ensure_vitals_collection, session_samples, vitals_sessions
+from vitals_classifier import VitalsClassifier
+from vitals_protocol import ProtocolError, decode as decode_vitals
+from spotify_tokens import SpotifyTokenCache
+from spotify_clients import SpotifyClientPool
+from playback_watcher import PlaybackWatcher
+from spotify_recommender import PlaylistRefresher, RecommendationCache, recommend_playlist
+import json
+import atexit
 
 # --- ADD THIS LOGGING CONFIGURATION ---
 logging.basicConfig(
@@ -76,7 +99,8 @@ app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
 mail = Mail(app)
 app.secret_key = SECRET_KEY
 bcrypt = Bcrypt(app)
-socketio = SocketIO(app)
+# message_queue (e.g. redis://) lets several server processes share rooms behind a load balancer
+socketio = SocketIO(app, async_mode=ASYNC_MODE, message_queue=os.getenv("SOCKETIO_MESSAGE_QUEUE") or None)
 
 client = MongoClient(MONGO_URI)
 db = client["emotion_music_app"]
@@ -87,6 +111,58 @@ users_col.create_index("email", unique=True)
 history_col.create_index("user_email")
 spotify_state_col.create_index([("user_email", 1), ("playlist_id", 1)], unique=True)
 
+SPOTIFY_LOOKUP_DEADLINE = float(os.getenv("SPOTIFY_LOOKUP_DEADLINE", "6"))
+RECOMMENDATION_REFRESH_SECONDS = int(os.getenv("RECOMMENDATION_REFRESH_SECONDS", "3600"))
+
+# Spotify recommendations are the same for every user, so they are cached per (language, emotion)
+# and shared across server processes through Mongo. Entries outlive a refresh cycle so that
+# precomputed rankings never expire between refreshes.
+recommendation_cache = RecommendationCache(
+    ttl=max(int(os.getenv("RECOMMENDATION_CACHE_TTL", "3600")), 2 * RECOMMENDATION_REFRESH_SECONDS),
+    collection=db["recommendation_cache"],
+)
+
+# One keep-alive Spotify client per user over a shared, bounded connection pool
+# SPOTIFY_API_BASE / SPOTIFY_ACCOUNTS_BASE point it at a stand-in such as fake_spotify.py
+spotify_clients = SpotifyClientPool(
+    idle_timeout=int(os.getenv("SPOTIFY_CLIENT_IDLE_SECONDS", "900")),
+    pool_maxsize=int(os.getenv("SPOTIFY_POOL_SIZE", "16")),
+    api_base=os.getenv("SPOTIFY_API_BASE") or None,
+    accounts_base=os.getenv("SPOTIFY_ACCOUNTS_BASE") or None,
+)
+
+# Re-rank every (language, emotion) pair in the background with an app-only (client credentials) token
+playlist_refresher = PlaylistRefresher(
+    lambda: spotify_clients.client(auth_manager=SpotifyClientCredentials(client_id=SPOTIPY_CLIENT_ID,
+                                                                         client_secret=SPOTIPY_CLIENT_SECRET)),
+    recommendation_cache,
+    interval=RECOMMENDATION_REFRESH_SECONDS,
+    deadline=SPOTIFY_LOOKUP_DEADLINE * 2,
+    log=logging.warning,
+)
+
+def _start_playlist_refresher():
+    if RECOMMENDATION_REFRESH_SECONDS > 0 and SPOTIPY_CLIENT_ID and SPOTIPY_CLIENT_SECRET:
+        playlist_refresher.start()
+
+# Under Gunicorn nothing runs __main__, so exactly one process per deployment opts in with this flag
+if os.getenv("RECOMMENDATION_REFRESHER") == "1":
+    _start_playlist_refresher()
+
+# Hardware vitals history: write-behind batches into a time-series collection
+vitals_col = ensure_vitals_collection(db, expire_after_seconds=os.getenv("VITALS_RETENTION_SECONDS"))
+vitals_writer = VitalsWriter(
+    vitals_col,
+    max_batch=int(os.getenv("VITALS_FLUSH_BATCH", "500")),
+    flush_interval=float(os.getenv("VITALS_FLUSH_SECONDS", "2")),
+)
+vitals_writer.start()
+atexit.register(vitals_writer.stop)
+
+# Camera emotion detection for browser clients; worker processes start on first use
+emotion_service = EmotionService(workers=os.getenv("EMOTION_SERVICE_WORKERS") or None)
+EMOTION_MAX_FRAME_BYTES = int(os.getenv("EMOTION_MAX_FRAME_BYTES", str(2 * 1024 * 1024)))
+
 # In app.py
 
 def get_reset_token(user, expires_sec=1800):
@@ -118,57 +194,36 @@ If you did not make this request then simply ignore this email and no changes wi
 # Spotify OAuth helper
 # ----------------------
 def get_spotify_oauth(scope=None):
-    return SpotifyOAuth(
+    return spotify_clients.auth_manager(SpotifyOAuth(
         client_id=SPOTIPY_CLIENT_ID,
         client_secret=SPOTIPY_CLIENT_SECRET,
         redirect_uri=SPOTIPY_REDIRECT_URI,
         scope=scope
-    )
+    ))
 
 # --- NEW: Reusable function to check Spotify status and refresh token ---
+def _save_spotify_fields(user_email, fields):
+    users_col.update_one({"email": user_email}, {"$set": fields})
+
+def _is_premium_account(token):
+    return spotify_clients.client(auth=token).current_user().get('product') == 'premium'
+
+# Tokens and premium status are cached per user; steady-state checks touch neither Mongo nor Spotify
+spotify_tokens = SpotifyTokenCache(
+    load_fn=lambda email: users_col.find_one({"email": email}),
+    refresh_fn=lambda refresh_token: get_spotify_oauth().refresh_access_token(refresh_token),
+    save_fn=_save_spotify_fields,
+    premium_fn=_is_premium_account,
+    ttl=int(os.getenv("SPOTIFY_TOKEN_CACHE_TTL", "300")),
+    log=logging.info,
+)
+
 def _check_and_refresh_spotify_token(user_email):
     """
-    Checks a user's Spotify token, refreshes if expired, and returns the current token.
+    Checks a user's Spotify token, refreshes it shortly before it expires, and returns the current token.
     Returns a tuple: (token, is_premium_status)
     """
-    user_data = users_col.find_one({"email": user_email})
-    
-    spotify_token = user_data.get("spotify_access_token")
-    spotify_refresh = user_data.get("spotify_refresh_token")
-    spotify_expires_at = user_data.get("spotify_expires_at")
-    is_premium = user_data.get("is_spotify_premium", False)
-
-    if not all([spotify_token, spotify_refresh, spotify_expires_at]):
-        return None, is_premium
-
-    if time.time() > spotify_expires_at:
-        try:
-            sp_oauth = get_spotify_oauth()
-            new_token_info = sp_oauth.refresh_access_token(spotify_refresh)
-            
-            spotify_token = new_token_info["access_token"] # Use the new token
-            
-            users_col.update_one(
-                {"email": user_email},
-                {"$set": {
-                    "spotify_access_token": new_token_info["access_token"],
-                    "spotify_expires_at": new_token_info["expires_at"]
-                }}
-            )
-            logging.info(f"Successfully refreshed Spotify token for {user_email}")
-        except Exception as e:
-            logging.error(f"Could not refresh Spotify token for {user_email}: {e}")
-            return None, is_premium
-    
-    try:
-        sp = spotipy.Spotify(auth=spotify_token)
-        user_info = sp.current_user()
-        is_premium = user_info.get('product') == 'premium'
-        users_col.update_one({"email": user_email}, {"$set": {"is_spotify_premium": is_premium}})
-    except Exception:
-        pass
-
-    return spotify_token, is_premium
+    return spotify_tokens.get(user_email)
 # ----------------------
 # Routes
 # ----------------------
@@ -583,64 +638,15 @@ def get_music_recommendation():
             return jsonify({"error": "Spotify token invalid or expired"}), 400
 
         try:
-            sp = spotipy.Spotify(auth=token)
+            sp = spotify_clients.get(session["user"]["email"], token)
         except Exception as e:
             return jsonify({"error": f"Spotify init error: {str(e)}"}), 500
 
-        # --- UNIFIED SEARCH LOGIC ---
-        LANGUAGE_SYNONYMS = {
-            "english": ["english", "hollywood"], "hindi": ["hindi", "bollywood"],
-            "malayalam": ["malayalam", "mollywood"], "tamil": ["tamil", "kollywood"],
-        }
-        EMOTION_SYNONYMS = {
-            "happy": ["happy", "joy", "positive", "vibe", "energetic"],
-            "sad": ["sad", "melancholy", "blue", "down"],
-            "angry": ["angry", "rage", "furious"], "neutral": ["neutral", "calm", "chill", "relaxed"],
-        }
-        lang_keywords = LANGUAGE_SYNONYMS.get(language, [language])
-        emo_keywords = EMOTION_SYNONYMS.get(emotion, [emotion])
-
-        query_templates = [f"{language} {emotion}", f"{emotion} {language}", f"{language} {emotion} playlist", f"{emotion} vibes"]
-        seen_ids = set()
-        app.logger.info(f"🔎 Dynamically searching Spotify for a {language} {emotion} playlist...")
-        for q in query_templates:
-            try:
-                results = sp.search(q=q, type="playlist", limit=15)
-                items = results.get("playlists", {}).get("items", []) or []
-                for p in items:
-                    if p and p.get("id"):
-                        seen_ids.add(p.get("id"))
-            except Exception as e:
-                app.logger.error(f"Spotify search error for '{q}': {e}")
-
-        valid_candidates = []
-        if seen_ids:
-            app.logger.info(f"Found {len(seen_ids)} potential playlists. Fetching details...")
-            for pid in list(seen_ids):
-                try:
-                    details = sp.playlist(pid, fields="id,uri,name,description,followers,external_urls")
-                    text = f"{(details.get('name') or '').lower()} {(details.get('description') or '').lower()}"
-                    if any(k in text for k in lang_keywords) and any(k in text for k in emo_keywords):
-                        valid_candidates.append(details)
-                except Exception as e:
-                    app.logger.error(f"Error fetching playlist details for {pid}: {e}")
-
-        chosen_playlist = None
-        if valid_candidates:
-            app.logger.info(f"Found {len(valid_candidates)} relevant playlists. Selecting the most popular.")
-            chosen_playlist = max(valid_candidates, key=lambda p: p.get("followers", {}).get("total", 0))
-
-        if not chosen_playlist:
-            app.logger.info("Primary search failed. Trying fallback search...")
-            try:
-                fallback_query = f"{language} {emotion} playlist"
-                results = sp.search(q=fallback_query, type="playlist", limit=1)
-                items = results.get("playlists", {}).get("items", []) or []
-                if items:
-                    pid = items[0]["id"]
-                    chosen_playlist = sp.playlist(pid, fields="id,uri,name,followers,external_urls")
-            except Exception as e:
-                app.logger.error(f"Final fallback Spotify search failed: {e}")
+        lookup_report = {}
+        chosen_playlist = recommend_playlist(sp, language, emotion, recommendation_cache, log=app.logger.info,
+                                             deadline=SPOTIFY_LOOKUP_DEADLINE, report=lookup_report)
+        if lookup_report:
+            app.logger.info(f"Spotify lookups for {language} {emotion}: {lookup_report}")
 
         if chosen_playlist:
             return jsonify({
@@ -653,7 +659,6 @@ def get_music_recommendation():
             })
         
         return jsonify({"error": f"No Spotify playlists found for {language} {emotion}"}), 404
-        # --- END OF UNIFIED LOGIC ---
 
     # --- Local Mode ---
     elif mode == 'Local':
@@ -673,15 +678,23 @@ def get_music_recommendation():
 
 
 
+@app.route("/recommendations/metrics", methods=["GET"])
+def recommendation_metrics():
+    if "user" not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify({"cache": recommendation_cache.get_stats(), "refresher": playlist_refresher.get_status(),
+                    "clients": spotify_clients.get_stats()})
+
 @app.route("/log_vitals_history", methods=['POST'])
 def log_vitals_history():
     if "user" not in session:
         return jsonify({"error": "Unauthorized"}), 401
 
-    data = request.get_json()
-    user_email = session["user"]["email"]
+    history_col.insert_one(_vitals_history_record(session["user"]["email"], request.get_json()))
+    return jsonify({"status": "success"}), 200
 
-    record = {
+def _vitals_history_record(user_email, data):
+    return {
         "user_email": user_email,
         "language": data.get("language"),
         "emotion": data.get("emotion"),
@@ -690,8 +703,6 @@ def log_vitals_history():
         "song_name": data.get("song_name"),
         "playlist_name": data.get("playlist_name"),
     }
-    history_col.insert_one(record)
-    return jsonify({"status": "success"}), 200
 
 # --- END OF VITALS PLAYER API ROUTES ---
 
@@ -732,7 +743,7 @@ def spotify_callback():
         token_info = sp_oauth.get_access_token(code, check_cache=False)
         user_email = session["user"]["email"]
 
-        sp = spotipy.Spotify(auth=token_info['access_token'])
+        sp = spotify_clients.get(user_email, token_info['access_token'])
         user_info = sp.current_user()
         is_premium = user_info.get('product') == 'premium'
 
@@ -745,6 +756,7 @@ def spotify_callback():
                 "is_spotify_premium": is_premium # Save the user's premium status
             }}
         )
+        spotify_tokens.invalidate(user_email)
         flash("Spotify account connected successfully!", "success")
 
     except Exception as e:
@@ -770,6 +782,8 @@ def unlink_spotify():
             "is_spotify_premium": "" # Also remove the premium flag
         }}
     )
+    spotify_tokens.invalidate(user_email)
+    spotify_clients.evict(user_email)
 
     flash("Spotify account unlinked successfully.", "info")
     return redirect(url_for("dashboard"))
@@ -787,20 +801,21 @@ def log_spotify_state():
     if not data or not data.get("playlist_id") or not data.get("track_uri"):
         return jsonify({"error": "Missing required data"}), 400
 
-    user_email = session["user"]["email"]
-    
+    _save_spotify_state(session["user"]["email"], data["playlist_id"], data["track_uri"], data.get("progress_ms", 0))
+    return jsonify({"status": "success"}), 200
+
+def _save_spotify_state(user_email, playlist_id, track_uri, progress_ms):
     spotify_state_col.update_one(
-        {"user_email": user_email, "playlist_id": data["playlist_id"]},
+        {"user_email": user_email, "playlist_id": playlist_id},
         {
             "$set": {
-                "track_uri": data["track_uri"],
-                "progress_ms": data.get("progress_ms", 0),
+                "track_uri": track_uri,
+                "progress_ms": progress_ms,
                 "timestamp": time.time()
             }
         },
         upsert=True
     )
-    return jsonify({"status": "success"}), 200
 
 @app.route("/get_spotify_state/<playlist_id>", methods=["GET"])
 def get_spotify_state(playlist_id):
@@ -831,7 +846,7 @@ def get_spotify_devices():
         return jsonify({"devices": []})
 
     try:
-        sp = spotipy.Spotify(auth=token)
+        sp = spotify_clients.get(session["user"]["email"], token)
         devices = sp.devices()
         return jsonify(devices or {"devices": []})
     except Exception as e:
@@ -854,13 +869,21 @@ def spotify_play():
     position_ms = data.get("position_ms", 0)
 
     try:
-        sp = spotipy.Spotify(auth=token)
+        sp = spotify_clients.get(session["user"]["email"], token)
         sp.start_playback(
             device_id=device_id,
             context_uri=context_uri,
             offset=offset,
             position_ms=position_ms
         )
+        history = data.get("history")
+        if isinstance(history, dict):
+            # The playback watcher logs each track of this context once, instead of every open tab
+            _playback_history[session["user"]["email"]] = {
+                "context_uri": context_uri, "language": history.get("language"), "emotion": history.get("emotion")}
+        else:
+            _playback_history.pop(session["user"]["email"], None)
+        playback_watcher.poke(session["user"]["email"])
         return jsonify({"status": "success"})
     except Exception as e:
         logging.error(f"Spotify start_playback error: {e}")
@@ -877,7 +900,7 @@ def spotify_player_action(action):
 
     device_id = request.get_json().get("device_id")
     try:
-        sp = spotipy.Spotify(auth=token)
+        sp = spotify_clients.get(session["user"]["email"], token)
         if action == 'pause':
             sp.pause_playback(device_id=device_id)
         elif action == 'resume':
@@ -886,6 +909,7 @@ def spotify_player_action(action):
             sp.next_track(device_id=device_id)
         elif action == 'previous':
             sp.previous_track(device_id=device_id)
+        playback_watcher.poke(session["user"]["email"])
         return jsonify({"status": "success"})
     except Exception as e:
         logging.error(f"Spotify action '{action}' error: {e}")
@@ -901,20 +925,84 @@ def get_current_playback():
         return jsonify(None)
     
     try:
-        sp = spotipy.Spotify(auth=token)
+        sp = spotify_clients.get(session["user"]["email"], token)
         playback = sp.current_playback()
         return jsonify(playback)
     except Exception as e:
         return jsonify(None)
 
+# --- Now playing push (/playback namespace) ---
+# One Spotify poll per user however many player tabs are open; tabs only receive changes.
+
+def _fetch_playback(user_email):
+    token, _ = _check_and_refresh_spotify_token(user_email)
+    if not token:
+        return None
+    return spotify_clients.get(user_email, token).current_playback()
+
+def _playback_room(user_email):
+    return f"playback:{user_email}"
+
+def _emit_playback(user_email, state):
+    socketio.emit('now_playing', state, namespace='/playback', to=_playback_room(user_email))
+
+# user email -> {"context_uri", "language", "emotion"} of the playlist the vitals player started
+_playback_history = {}
+
+def _log_played_track(user_email, state):
+    started = _playback_history.get(user_email)
+    if not started or (state["context"] or {}).get("uri") != started["context_uri"]:
+        return
+    history_col.insert_one(_vitals_history_record(
+        user_email, {"language": started.get("language"), "emotion": started.get("emotion"),
+                     "song_name": state["item"]["name"]}))
+
+playback_watcher = PlaybackWatcher(
+    _fetch_playback,
+    _emit_playback,
+    _save_spotify_state,
+    interval=float(os.getenv("SPOTIFY_PLAYBACK_POLL_SECONDS", "3")),
+    idle_interval=float(os.getenv("SPOTIFY_PLAYBACK_IDLE_SECONDS", "15")),
+    log=logging.warning,
+    track_fn=_log_played_track,
+)
+_playback_watcher_started = False
+
+def _ensure_playback_watcher():
+    global _playback_watcher_started
+    if not _playback_watcher_started:
+        _playback_watcher_started = True
+        socketio.start_background_task(playback_watcher.run, socketio.sleep)
+
+@socketio.on('connect', namespace='/playback')
+def handle_playback_connect():
+    if "user" not in session:
+        return False  # reject anonymous clients
+    _ensure_playback_watcher()
+    user_email = session["user"]["email"]
+    join_room(_playback_room(user_email))
+    # the last known state right away; later pushes only carry changes
+    state = playback_watcher.subscribe(request.sid, user_email)
+    socketio.emit('now_playing', state, namespace='/playback', to=request.sid)
+
+@socketio.on('disconnect', namespace='/playback')
+def handle_playback_disconnect():
+    playback_watcher.unsubscribe(request.sid)
+
+@app.route("/spotify/playback-metrics", methods=["GET"])
+def playback_metrics():
+    if "user" not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(playback_watcher.get_stats())
+
 # --- END OF NEW VITALS PLAYER API ROUTES ---
 
-def map_vitals_to_emotion(bpm, hrv):
-    """Maps BPM and HRV to an emotional state."""
-    if bpm > 100 and hrv < 25: return "angry"
-    if bpm > 90 and hrv > 40: return "happy"
-    if bpm < 70 and hrv < 30: return "sad"
-    return "neutral"
+# Maps windows of BPM and HRV to an emotional state. VITALS_RULES overrides the threshold
+# table as JSON: [["angry", 100, null, null, 25], ...] (bpm above, bpm below, hrv above, hrv below)
+vitals_classifier = VitalsClassifier(
+    rules=json.loads(os.getenv("VITALS_RULES")) if os.getenv("VITALS_RULES") else None,
+    window=int(os.getenv("VITALS_SMOOTHING_WINDOW", "8")),
+)
 
  
 @socketio.on('connect')
@@ -925,30 +1013,212 @@ def handle_connect():
 def handle_disconnect():
     print('Web client disconnected')
 
+def _emit_vitals(room, payload):
+    socketio.emit('vitals_from_server', payload, namespace='/hardware', to=room)
+
+# Vitals are routed per user/device and emitted at most VITALS_UI_RATE_HZ times a second per room
+vitals_hub = VitalsHub(
+    _emit_vitals,
+    vitals_classifier.classify_window,
+    ui_rate_hz=float(os.getenv("VITALS_UI_RATE_HZ", "4")),
+    window_size=int(os.getenv("VITALS_WINDOW_SIZE", "120")),
+    classify_window=vitals_classifier.window,
+)
+_vitals_hub_started = False
+
+# Devices authenticate with a per-device token issued at pairing; the owner is taken from the pairing record.
+# VITALS_ALLOW_UNPAIRED=1 keeps accepting devices without a valid token, into the shared 'unpaired' room.
+device_registry = DeviceRegistry(db["devices"])
+VITALS_ALLOW_UNPAIRED = os.getenv("VITALS_ALLOW_UNPAIRED", "0") == "1"
+
+def _ensure_vitals_hub():
+    global _vitals_hub_started
+    if not _vitals_hub_started:
+        _vitals_hub_started = True
+        socketio.start_background_task(vitals_hub.run, socketio.sleep)
+
+@app.route("/devices", methods=["GET"])
+def list_devices():
+    if "user" not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(device_registry.devices(session["user"]["email"]))
+
+@app.route("/devices/pair", methods=["POST"])
+def pair_device():
+    """Pair a device ({"device_id", "name"}) with the user. The token is only ever returned here."""
+    if "user" not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    data = request.get_json(silent=True) or {}
+    try:
+        token = device_registry.pair(session["user"]["email"], data.get("device_id"), data.get("name"))
+    except DevicePairingError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"device_id": data["device_id"].strip(), "token": token})
+
+@app.route("/devices/<device_id>/unpair", methods=["POST"])
+def unpair_device(device_id):
+    if "user" not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    if not device_registry.unpair(session["user"]["email"], device_id):
+        return jsonify({"error": "Device not found"}), 404
+    return jsonify({"status": "unpaired"})
+
+@app.route("/vitals/metrics", methods=["GET"])
+def vitals_metrics():
+    if "user" not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    stats = vitals_hub.get_stats()
+    stats["writer"] = vitals_writer.get_stats()
+    return jsonify(stats)
+
+@app.route("/vitals/sessions", methods=["GET"])
+def vitals_session_list():
+    if "user" not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(vitals_sessions(vitals_col, session["user"]["email"]))
+
+@app.route("/vitals/history/<session_id>", methods=["GET"])
+def vitals_history(session_id):
+    """Downsampled BPM/HRV of one of the user's hardware sessions (?bucket=<seconds>)."""
+    if "user" not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    bucket = min(3600.0, max(1.0, request.args.get("bucket", 10, type=float)))
+    series = downsampled_vitals(vitals_col, session["user"]["email"], session_id, bucket_seconds=bucket)
+    return jsonify({"session_id": session_id, "bucket_seconds": bucket, "points": series})
+
+@app.route("/vitals/history/<session_id>/emotions", methods=["GET"])
+def vitals_history_emotions(session_id):
+    """Reclassify a stored session window by window (?window=<samples>&step=<samples>)."""
+    if "user" not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    ts, bpm, hrv = session_samples(vitals_col, session["user"]["email"], session_id)
+    ends, labels = vitals_classifier.classify_series(
+        bpm, hrv, window=request.args.get("window", type=int), step=request.args.get("step", type=int))
+    return jsonify({"session_id": session_id,
+                    "windows": [{"t": float(ts[i]), "emotion": label} for i, label in zip(ends, labels)]})
+
 @socketio.on('connect', namespace='/hardware')
-def handle_hardware_connect():
-    print(f'Hardware client connected: {request.sid}')
+def handle_hardware_connect(auth=None):
+    """
+    Browsers (logged in) join their user's room, plus the room of unpaired devices if those are allowed.
+    Devices authenticate with auth or query parameters 'device_id' and 'token' from POST /devices/pair;
+    the owner comes from the pairing, never from the device.
+    """
+    _ensure_vitals_hub()
+    if "user" in session:
+        join_room(vitals_hub.room_for(session["user"]["email"]))
+        if VITALS_ALLOW_UNPAIRED:
+            join_room(vitals_hub.room_for(None))
+        return
+    auth = auth if isinstance(auth, dict) else {}
+    device_id = auth.get('device_id') or request.args.get('device_id')
+    user = device_registry.verify(device_id, auth.get('token') or request.args.get('token'))
+    if user is None and not VITALS_ALLOW_UNPAIRED:
+        logging.warning(f"Rejected hardware client {request.sid}: device {device_id or 'unnamed'} is not paired")
+        return False
+    vitals_hub.bind(request.sid, device_id, user, session_id=uuid.uuid4().hex)
+    print(f'Hardware client connected: {request.sid} (device={device_id or "unnamed"}, user={user or "unpaired"})')
+
+@socketio.on('disconnect', namespace='/hardware')
+def handle_hardware_disconnect():
+    vitals_hub.unbind(request.sid)
 
 @socketio.on('vitals_update', namespace='/hardware')
 def handle_vitals_update(data):
     """
-    Receives data from ESP32 and broadcasts it to the web client.
-    The ESP32 should send data like: {'bpm': 85, 'hrv': 45}
+    Receives data from ESP32 and queues it for the owner's browsers.
+    The ESP32 should send data like: {'bpm': 85, 'hrv': 45}; device and owner
+    are the ones authenticated at connect, whatever the sample says.
+    High-rate sensors can instead send bytes in the vitals_protocol format.
     """
-    print(f"Received vitals from hardware: {data}")
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        _handle_binary_vitals(data)
+        return
+    if not isinstance(data, dict):
+        return
+    device_id, user, session_id = vitals_hub.identity(request.sid)
+    bpm, hrv, now = data.get('bpm') or 0, data.get('hrv') or 0, time.time()
+    vitals_hub.add_sample(device_id, bpm, hrv, user, now, client_ts=data.get('client_ts'))
+    if user is not None:                                # history only for devices paired to a verified owner
+        vitals_writer.add(user, device_id, session_id, bpm, hrv, now)
+
+def _handle_binary_vitals(data):
+    try:
+        batches = decode_vitals(data)
+    except ProtocolError as e:
+        logging.warning(f"Bad binary vitals from {request.sid}: {e}")
+        return
+    bound_device, user, session_id = vitals_hub.identity(request.sid)
+    for batch in batches:
+        if user is not None and batch.device_id and batch.device_id != bound_device:
+            # A paired connection only speaks for its own device
+            logging.warning(f"Dropped vitals for device {batch.device_id} sent on {bound_device}'s connection")
+            continue
+        device_id = batch.device_id or bound_device
+        vitals_hub.add_samples(device_id, batch.ts, batch.bpm, batch.hrv, user)
+        if user is not None:
+            vitals_writer.add_many(user, device_id, session_id, batch.ts, batch.bpm, batch.hrv)
+
+# --- Camera emotion detection service (/emotion namespace) ---
+
+@app.route("/emotion/metrics", methods=["GET"])
+def emotion_metrics():
+    if "user" not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(emotion_service.get_metrics())
 
-    emotion = map_vitals_to_emotion(data.get('bpm', 0), data.get('hrv', 0))
+def _emit_emotion_events(client_id, events):
+    for event in events:
+        socketio.emit('emotion_event', event, namespace='/emotion', to=client_id)
 
-    payload = {
-        'bpm': data.get('bpm'),
-        'hrv': data.get('hrv'),
-        'detected_emotion': emotion
-    }
+@socketio.on('connect', namespace='/emotion')
+def handle_emotion_connect():
+    if "user" not in session:
+        return False  # reject anonymous clients
+    print(f'Emotion client connected: {request.sid}')
+
+@socketio.on('disconnect', namespace='/emotion')
+def handle_emotion_disconnect():
+    emotion_service.close_session(request.sid)
+
+@socketio.on('start_detection', namespace='/emotion')
+def handle_emotion_start():
+    """Starts a fresh detection window for this client."""
+    emotion_service.open_session(request.sid)
+    emit('emotion_event', {'type': 'started'})
 
-    socketio.emit('vitals_from_server', payload, namespace='/hardware')
+@socketio.on('frame', namespace='/emotion')
+def handle_emotion_frame(data):
+    """
+    Receives one camera frame as JPEG/PNG bytes, or {'image': '<base64 or data URL>'}.
+    Results come back asynchronously as 'emotion_event' messages.
+    """
+    image = data.get('image') if isinstance(data, dict) else data
+    if isinstance(image, str):
+        encoded = image.split(',', 1)[-1]
+        if len(encoded) > EMOTION_MAX_FRAME_BYTES * 4 // 3 + 4:
+            emit('emotion_event', {'type': 'error', 'message': 'Frame is too large'})
+            return
+        try:
+            image = base64.b64decode(encoded, validate=True)
+        except (binascii.Error, ValueError):
+            emit('emotion_event', {'type': 'error', 'message': 'Frame is not valid base64'})
+            return
+    elif not isinstance(image, (bytes, bytearray, memoryview)):
+        emit('emotion_event', {'type': 'error', 'message': 'Frame must be image bytes or base64'})
+        return
+    if not image:
+        return
+    if len(image) > EMOTION_MAX_FRAME_BYTES:
+        emit('emotion_event', {'type': 'error', 'message': 'Frame is too large'})
+        return
+    emotion_service.submit_frame(request.sid, bytes(image), _emit_emotion_events)
 
 if __name__ == "__main__":
     host = "127.0.0.1"
     port = 5000
-    print(f"🚀 Your Flask app is running at: http://{host}:{port}/")
+    print(f"🚀 Your Flask app is running at: http://{host}:{port}/ (async mode: {socketio.async_mode})")
+    # The debug reloader runs this script twice; only the serving child (WERKZEUG_RUN_MAIN) refreshes
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        _start_playlist_refresher()
     socketio.run(app, host=host, port=port, debug=True)
\ No newline at end of file
@@ -0,0 +1,51 @@
+# bench_common.py
+"""
+Helpers shared by the benchmark and load-test scripts: latency summaries
+and logging in / pairing devices over plain HTTP. Kept free of Socket.IO
+so that benchmarks which only talk HTTP do not need python-socketio.
+"""
+import numpy as np
+import requests
+
+
+def summarize(samples):
+    """Latency percentiles in milliseconds for a list of durations in seconds."""
+    if not samples:
+        return {"count": 0}
+    ms = np.asarray(samples) * 1000.0
+    return {
+        "count": int(ms.size),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p90_ms": round(float(np.percentile(ms, 90)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def login(url, email, password):
+    """Log in through the normal form and return the session cookie header."""
+    http = requests.Session()
+    response = http.post(f"{url}/login", data={"email": email, "password": password}, allow_redirects=False)
+    if response.status_code != 302 or "session" not in http.cookies:
+        raise SystemExit(f"Login failed for {email} (HTTP {response.status_code})")
+    return "; ".join(f"{k}={v}" for k, v in http.cookies.items())
+
+
+def pair_device(url, cookie, device_id):
+    """Pair ``device_id`` with the logged-in account and return its connect auth ({"device_id", "token"})."""
+    response = requests.post(f"{url}/devices/pair", json={"device_id": device_id}, headers={"Cookie": cookie})
+    if response.status_code != 200:
+        raise SystemExit(f"Pairing {device_id} failed (HTTP {response.status_code}): {response.text}")
+    return {"device_id": device_id, "token": response.json()["token"]}
+
+
+def unpair_device(url, cookie, device_id):
+    """Remove a device paired by ``pair_device``; failures are only reported, so cleanup always continues."""
+    try:
+        response = requests.post(f"{url}/devices/{device_id}/unpair", headers={"Cookie": cookie}, timeout=10)
+        if response.status_code not in (200, 404):
+            print(f"Unpairing {device_id} failed (HTTP {response.status_code})")
+    except requests.RequestException as e:
+        print(f"Unpairing {device_id} failed: {e}")
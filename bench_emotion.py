@@ -0,0 +1,190 @@
+# bench_emotion.py
+"""
+Offline replay benchmark for the camera emotion-detection pipeline.
+
+Feeds frames from a video file or an image directory through the same face
+detection, crop, DeepFace and aggregation path the desktop player uses, without
+a webcam or the Tk GUI, and prints a JSON report:
+
+    python bench_emotion.py recordings/session1.mp4 --output bench.json
+    python bench_emotion.py frames/ --detection-mode full --batch-size 8
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+
+import cv2
+import psutil
+
+from bench_common import summarize
+from emotion_engine import DetectorBackendManager, FaceDetector, EmotionAggregator, analyze_faces_batch, load_emotion_model
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+STAGES = ["cvtColor", "cascade", "crop", "inference", "aggregation"]
+
+
+def iter_frames(source, frame_step=1, max_frames=None):
+    """Yield BGR frames from a video file or a directory of images."""
+    count = 0
+    if os.path.isdir(source):
+        names = sorted(f for f in os.listdir(source) if f.lower().endswith(IMAGE_EXTENSIONS))
+        for i, name in enumerate(names):
+            if i % frame_step:
+                continue
+            frame = cv2.imread(os.path.join(source, name))
+            if frame is None:
+                continue
+            yield frame
+            count += 1
+            if max_frames and count >= max_frames:
+                return
+        return
+
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise SystemExit(f"Could not open video source: {source}")
+    try:
+        index = 0
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            index += 1
+            if (index - 1) % frame_step:
+                continue
+            yield frame
+            count += 1
+            if max_frames and count >= max_frames:
+                break
+    finally:
+        cap.release()
+
+
+def run_benchmark(source, frame_step=1, max_frames=None, batch_size=1, detection_mode=None,
+                  half_life=8.0, frame_interval=0.5, skip_inference=False, detector_backends=None):
+    process = psutil.Process()
+    peak_rss = process.memory_info().rss
+
+    detector = FaceDetector(mode=detection_mode)
+    backends = DetectorBackendManager(detector_backends)
+    if not skip_inference:
+        load_start = time.perf_counter()
+        load_emotion_model(backends)
+        model_load_seconds = time.perf_counter() - load_start
+    else:
+        model_load_seconds = 0.0
+
+    timings = {stage: [] for stage in STAGES}
+    aggregator = EmotionAggregator(half_life=half_life)
+    pending = []
+    pending_ts = []
+    frames = faces_found = 0
+
+    def flush_batch():
+        if not pending:
+            return
+        t0 = time.perf_counter()
+        results = analyze_faces_batch(pending, backends)
+        timings["inference"].append((time.perf_counter() - t0) / len(pending))
+        for frame_ts, result in zip(pending_ts, results):
+            if result:
+                t0 = time.perf_counter()
+                aggregator.update(result["emotion"], result.get("scores"), frame_ts)
+                timings["aggregation"].append(time.perf_counter() - t0)
+        pending.clear()
+        pending_ts.clear()
+
+    wall_start = time.perf_counter()
+    for frame in iter_frames(source, frame_step, max_frames):
+        frames += 1
+        detection = detector.detect(frame, frames)
+        timings["cvtColor"].append(detector.last_timings.get("cvtColor", 0.0))
+        timings["cascade"].append(detector.last_timings.get("cascade", 0.0))
+
+        t0 = time.perf_counter()
+        crop = detection.face_crop()
+        timings["crop"].append(time.perf_counter() - t0)
+        if detection.faces:
+            faces_found += 1
+
+        if not skip_inference:
+            pending.append(crop)
+            pending_ts.append(frames * frame_interval)
+            if len(pending) >= batch_size:
+                flush_batch()
+        peak_rss = max(peak_rss, process.memory_info().rss)
+    if not skip_inference:
+        flush_batch()
+    wall_seconds = time.perf_counter() - wall_start
+
+    return {
+        "source": source,
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "config": {
+            "frame_step": frame_step,
+            "max_frames": max_frames,
+            "batch_size": batch_size,
+            "detection_mode": detector.mode,
+            "downscale": detector.downscale,
+            "redetect_interval": detector.redetect_interval,
+            "detector_backends": backends.backends,
+            "half_life": half_life,
+            "frame_interval": frame_interval,
+            "skip_inference": skip_inference,
+        },
+        "frames": frames,
+        "frames_with_face": faces_found,
+        "wall_seconds": round(wall_seconds, 3),
+        "fps": round(frames / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+        "model_load_seconds": round(model_load_seconds, 3),
+        "peak_rss_mb": round(peak_rss / (1024 * 1024), 1),
+        "stages": {stage: summarize(samples) for stage, samples in timings.items()},
+        "detector_stats": dict(detector.stats),
+        "backend_stats": backends.get_stats(),
+        "detections": aggregator.count,
+        "locked_emotion": aggregator.decision(verbose=False),
+        "locked_confidence": round(aggregator.confidence()[1], 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a video or image folder through the emotion-detection pipeline.")
+    parser.add_argument("source", help="video file or directory of images")
+    parser.add_argument("--frame-step", type=int, default=1, help="use every Nth frame")
+    parser.add_argument("--max-frames", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=1, help="face crops per DeepFace call")
+    parser.add_argument("--detection-mode", choices=["tracking", "full"], default=None)
+    parser.add_argument("--half-life", type=float, default=8.0, help="seconds for a detection's weight to halve")
+    parser.add_argument("--frame-interval", type=float, default=0.5, help="replayed seconds between frames")
+    parser.add_argument("--backends", nargs="+", default=None, help="DeepFace detector backends to choose from")
+    parser.add_argument("--skip-inference", action="store_true", help="only time face detection and cropping")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(
+        args.source,
+        frame_step=max(1, args.frame_step),
+        max_frames=args.max_frames,
+        batch_size=max(1, args.batch_size),
+        detection_mode=args.detection_mode,
+        half_life=args.half_life,
+        frame_interval=args.frame_interval,
+        skip_inference=args.skip_inference,
+        detector_backends=args.backends,
+    )
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+        print(f"Benchmark report written to {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
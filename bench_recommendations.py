@@ -0,0 +1,219 @@
+# bench_recommendations.py
+"""
+Offline benchmark for Spotify recommendations and player calls.
+
+Starts the fake Web API from fake_spotify.py (or uses one given with
+``--fake-url``) and, for each latency profile, measures:
+
+* cold recommendations: ``recommend_playlist`` for every language x emotion
+  pair with an empty cache, plus the Spotify calls each one costs;
+* warm recommendations: the same pairs again, served from the cache;
+* player calls (devices, current playback, next track) on one pooled
+  keep-alive client versus a fresh client per call.
+
+With ``--app-url`` (a running app.py started with SPOTIFY_API_BASE pointing
+at the same fake) it also times ``/get_music_recommendation`` end to end.
+The account must have Spotify linked, which against the fake means any
+non-empty ``spotify_access_token``/``spotify_refresh_token`` and a future
+``spotify_expires_at`` on the user document. The app keeps its own
+recommendation cache, so only the first profile measures cold lookups there.
+
+    python bench_recommendations.py --profiles lan typical slow --output recs.json
+    python bench_recommendations.py --app-url http://127.0.0.1:5000 --email me@example.com --password secret
+"""
+import sys
+import json
+import time
+import argparse
+
+import requests
+import spotipy
+
+from bench_common import login, summarize
+from fake_spotify import FakeSpotifyServer
+from spotify_clients import SpotifyClientPool
+from spotify_recommender import (EMOTION_SYNONYMS, LANGUAGE_SYNONYMS, RecommendationCache, ranking_complete,
+                                 recommend_playlist)
+
+# Fake API latency profiles: mean and jitter in ms, share of injected 500s and 429s
+PROFILES = {
+    "local": {"latency_ms": 0, "jitter_ms": 0, "error_rate": 0.0, "rate_limit_rate": 0.0},
+    "lan": {"latency_ms": 20, "jitter_ms": 5, "error_rate": 0.0, "rate_limit_rate": 0.0},
+    "typical": {"latency_ms": 120, "jitter_ms": 40, "error_rate": 0.0, "rate_limit_rate": 0.0},
+    "slow": {"latency_ms": 400, "jitter_ms": 150, "error_rate": 0.0, "rate_limit_rate": 0.0},
+    "flaky": {"latency_ms": 120, "jitter_ms": 40, "error_rate": 0.03, "rate_limit_rate": 0.03},
+}
+DEFAULT_PROFILES = ["lan", "typical", "slow", "flaky"]
+BENCH_TOKEN = "bench-token"
+
+
+class FakeControl:
+    """Client for the fake API's /_fake endpoints."""
+
+    def __init__(self, url):
+        self.url = url
+        self.http = requests.Session()
+
+    def configure(self, profile):
+        self.http.post(f"{self.url}/_fake/config", json=profile).raise_for_status()
+
+    def reset(self):
+        self.http.post(f"{self.url}/_fake/reset").raise_for_status()
+
+    def stats(self):
+        return self.http.get(f"{self.url}/_fake/stats").json()
+
+
+def _quiet(*_):
+    pass
+
+
+def bench_recommendations(pool, control, pairs, deadline):
+    cache = RecommendationCache(ttl=3600)
+    sp = pool.client(auth=BENCH_TOKEN)
+    report = {}
+    for phase in ("cold", "warm"):
+        control.reset()
+        latencies, picks, incomplete = [], 0, 0
+        for language, emotion in pairs:
+            lookup = {}
+            started = time.perf_counter()
+            pick = recommend_playlist(sp, language, emotion, cache, log=_quiet, deadline=deadline, report=lookup)
+            latencies.append(time.perf_counter() - started)
+            picks += pick is not None
+            incomplete += not ranking_complete(lookup)
+        stats = control.stats()
+        report[phase] = {
+            "latency": summarize(latencies),
+            "picks": picks,
+            "deadline_cut": incomplete,
+            "spotify_calls": stats["total_calls"],
+            "calls_per_recommendation": round(stats["total_calls"] / len(pairs), 2),
+            "calls": stats["calls"],
+            "injected": stats["injected"],
+        }
+    return report
+
+
+def bench_player(pool, base, iterations):
+    """Per-call latency of player endpoints on the user's pooled client (as the routes get it) vs. a fresh client."""
+    calls = {
+        "devices": lambda sp: sp.devices(),
+        "current_playback": lambda sp: sp.current_playback(),
+        "next_track": lambda sp: sp.next_track(device_id="fake-desktop"),
+    }
+    pooled = pool.get("bench-user", BENCH_TOKEN)
+    try:
+        pooled.start_playback(device_id="fake-desktop", context_uri="spotify:playlist:37i9fakeEnglishHappy01")
+    except spotipy.exceptions.SpotifyException:
+        pass                                            # injected fault; current_playback may return None
+
+    def fresh():
+        sp = spotipy.Spotify(auth=BENCH_TOKEN)
+        sp.prefix = f"{base}/v1/"
+        return sp
+
+    report = {}
+    for name, call in calls.items():
+        timings = {"pooled": [], "fresh": []}
+        for _ in range(iterations):
+            for mode in timings:
+                sp = pool.get("bench-user", BENCH_TOKEN) if mode == "pooled" else fresh()
+                started = time.perf_counter()
+                try:
+                    call(sp)
+                except spotipy.exceptions.SpotifyException:
+                    continue
+                timings[mode].append(time.perf_counter() - started)
+        report[name] = {mode: summarize(samples) for mode, samples in timings.items()}
+    return report
+
+
+def bench_app(app_url, cookie, control, pairs):
+    """End-to-end /get_music_recommendation latency and the Spotify calls behind it."""
+    http = requests.Session()
+    http.headers["Cookie"] = cookie
+    control.reset()
+    latencies, failures = [], 0
+    for language, emotion in pairs:
+        started = time.perf_counter()
+        response = http.post(f"{app_url}/get_music_recommendation",
+                             json={"emotion": emotion, "language": language, "mode": "Spotify"})
+        latencies.append(time.perf_counter() - started)
+        failures += response.status_code != 200
+    stats = control.stats()
+    return {"latency": summarize(latencies), "failures": failures, "spotify_calls": stats["total_calls"],
+            "calls": stats["calls"]}
+
+
+def run_benchmark(profiles, fake_url=None, languages=None, emotions=None, deadline=6.0, player_iterations=20,
+                  app_url=None, email=None, password=None):
+    server = None
+    if not fake_url:
+        server = FakeSpotifyServer()
+        server.start()
+        fake_url = server.url
+    control = FakeControl(fake_url)
+    pool = SpotifyClientPool(api_base=f"{fake_url}/v1")
+    pairs = [(language, emotion) for language in (languages or list(LANGUAGE_SYNONYMS))
+             for emotion in (emotions or list(EMOTION_SYNONYMS))]
+    cookie = login(app_url, email, password) if app_url else None
+
+    results = {}
+    try:
+        for name in profiles:
+            control.configure(PROFILES[name])
+            print(f"Profile '{name}': {len(pairs)} language/emotion pairs...", file=sys.stderr)
+            results[name] = {
+                "profile": PROFILES[name],
+                "recommendations": bench_recommendations(pool, control, pairs, deadline),
+                "player": bench_player(pool, fake_url, player_iterations),
+            }
+            if app_url:
+                results[name]["app"] = bench_app(app_url, cookie, control, pairs)
+    finally:
+        if server:
+            server.shutdown()
+
+    return {
+        "fake_url": fake_url,
+        "app_url": app_url,
+        "config": {"pairs": len(pairs), "deadline": deadline, "player_iterations": player_iterations},
+        "profiles": results,
+        "client_pool": pool.get_stats(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Spotify recommendations against the local fake API.")
+    parser.add_argument("--profiles", nargs="+", choices=sorted(PROFILES), default=DEFAULT_PROFILES)
+    parser.add_argument("--fake-url", help="use an already running fake_spotify.py instead of starting one")
+    parser.add_argument("--languages", nargs="+", default=None)
+    parser.add_argument("--emotions", nargs="+", default=None)
+    parser.add_argument("--deadline", type=float, default=6.0, help="recommendation lookup deadline in seconds")
+    parser.add_argument("--player-iterations", type=int, default=20)
+    parser.add_argument("--app-url", help="also time /get_music_recommendation on a running app.py")
+    parser.add_argument("--email")
+    parser.add_argument("--password")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+    if args.app_url and not (args.email and args.password):
+        parser.error("--app-url needs --email and --password")
+
+    report = run_benchmark(
+        args.profiles, fake_url=args.fake_url.rstrip("/") if args.fake_url else None,
+        languages=args.languages, emotions=args.emotions, deadline=args.deadline,
+        player_iterations=max(1, args.player_iterations),
+        app_url=args.app_url.rstrip("/") if args.app_url else None, email=args.email, password=args.password,
+    )
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+        print(f"Recommendation benchmark written to {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+# camera_capture.py
+import threading
+import time
+
+import numpy as np
+
+
+class CameraCapture:
+    """Reads frames from an opened cv2.VideoCapture on its own thread.
+
+    Frames are decoded straight into a small ring of preallocated numpy arrays,
+    each tagged with a sequence number and capture timestamp. Readers call
+    ``latest()`` to get the newest frame without ever blocking on the camera.
+    The returned array is a ring slot and stays valid until the writer laps
+    the ring (``buffer_size - 1`` frames later), so copy it to keep it longer;
+    ``copy_frame()`` does that safely even after a stall.
+    """
+
+    def __init__(self, cap, buffer_size=4, max_consecutive_failures=25):
+        self.cap = cap
+        self.buffer_size = max(2, int(buffer_size))
+        self.max_consecutive_failures = max_consecutive_failures
+        self._ring = None
+        self._seqs = [0] * self.buffer_size
+        self._stamps = [0.0] * self.buffer_size
+        self._latest_index = -1
+        self._writing_index = -1               # slot the capture thread is decoding into
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._running = False
+        self.failed = False
+        # counters
+        self._last_read_seq = 0
+        self._fps_window_start = time.time()
+        self._fps_window_frames = 0
+        self.stats = {"captured": 0, "dropped": 0, "read_failures": 0, "fps": 0.0}
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._capture_loop, name="camera-capture", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        """Stops the capture thread. Call this before releasing the VideoCapture."""
+        self._running = False
+        if self._thread and self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    def latest(self):
+        """Return (seq, timestamp, frame) of the newest frame, or (0, 0.0, None) if none yet."""
+        with self._lock:
+            idx = self._latest_index
+            if idx < 0:
+                return 0, 0.0, None
+            seq, ts, frame = self._seqs[idx], self._stamps[idx], self._ring[idx]
+            if seq > self._last_read_seq:
+                if self._last_read_seq:
+                    self.stats["dropped"] += seq - self._last_read_seq - 1
+                self._last_read_seq = seq
+        return seq, ts, frame
+
+    def copy_frame(self, seq, frame):
+        """Copy of ``frame`` as returned by ``latest()`` with ``seq``, or None if its slot was reused since."""
+        with self._lock:
+            for idx, slot_seq in enumerate(self._seqs):
+                if slot_seq == seq and self._ring is not None and self._ring[idx] is frame:
+                    if idx == self._writing_index:
+                        return None        # the writer is decoding a newer frame into it
+                    return frame.copy()
+        return None
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+    # --- internals ---
+    def _capture_loop(self):
+        failures = 0
+        while self._running:
+            with self._lock:
+                write_index = (self._latest_index + 1) % self.buffer_size
+                slot = self._ring[write_index] if self._ring is not None else None
+                self._writing_index = write_index
+            try:
+                ret, frame = self.cap.read(slot) if slot is not None else self.cap.read()
+            except Exception:
+                ret, frame = False, None
+            now = time.time()
+
+            if not ret or frame is None:
+                failures += 1
+                with self._lock:
+                    self._writing_index = -1
+                    self._seqs[write_index] = 0    # a failed read may have half-overwritten the slot
+                    self.stats["read_failures"] += 1
+                if failures >= self.max_consecutive_failures:
+                    print("Camera capture: too many failed reads, stopping.")
+                    self.failed = True
+                    self._running = False
+                    break
+                time.sleep(0.01)
+                continue
+            failures = 0
+
+            with self._lock:
+                if self._ring is None or frame is not self._ring[write_index]:
+                    # first frame, or the camera changed resolution: (re)allocate the ring
+                    if self._ring is None or self._ring[0].shape != frame.shape:
+                        self._ring = [np.empty_like(frame) for _ in range(self.buffer_size)]
+                    np.copyto(self._ring[write_index], frame)
+                self._seq += 1
+                self._seqs[write_index] = self._seq
+                self._stamps[write_index] = now
+                self._latest_index = write_index
+                self._writing_index = -1
+                self.stats["captured"] += 1
+                self._fps_window_frames += 1
+                elapsed = now - self._fps_window_start
+                if elapsed >= 1.0:
+                    self.stats["fps"] = round(self._fps_window_frames / elapsed, 1)
+                    self._fps_window_start = now
+                    self._fps_window_frames = 0
@@ -0,0 +1,824 @@
+# emotion_engine.py
+import os
+import math
+import threading
+import queue
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+# ---------------------------
+# Defaults
+# ---------------------------
+ENGINE_DEFAULTS = {
+    "emotions": ["angry", "happy", "neutral", "sad"],
+    "confidence_threshold": 0.4,           # probability threshold (0.0-1.0)
+    "detector_backends": ["mtcnn", "opencv"],  # tried in order when analysing a crop
+    "lock_in_share": 0.4,                  # share of detections the top emotion needs to lock in
+    "sad_lock_in_share": 0.25,             # 'sad' is locked in more readily (sensitive rule)
+
+    "face_detection_scale_factor": 1.1,
+    "face_detection_min_neighbors": 5,
+    "face_detection_min_size": (130, 130),
+    "detection_cache_size": 4,             # recent per-frame detections kept by sequence number
+    "face_detection_mode": "tracking",     # "tracking" (downscaled cascade + template tracking) or "full"
+    "face_detection_downscale": 0.5,       # cascade runs on the frame resized by this factor
+    "face_redetect_interval": 5,           # run the cascade every N frames, track in between
+    "face_track_min_score": 0.6,           # template-match score below this forces a re-detect
+    "face_track_search_margin": 0.5,       # search window = box grown by this fraction per side
+}
+
+
+def _deepface():
+    """Imports DeepFace lazily so importing this module does not pull in TensorFlow."""
+    from deepface import DeepFace
+    return DeepFace
+
+
+# ---------------------------
+# Per-frame face detection
+# ---------------------------
+class FrameDetection:
+    """Face boxes for one captured frame, computed once and shared by the overlay and analysis.
+
+    ``faces`` are always in full-resolution frame coordinates; ``gray`` is the
+    (possibly downscaled) grayscale image the detector worked on, at ``scale``.
+    """
+    __slots__ = ("seq", "timestamp", "frame", "gray", "scale", "faces", "tracked")
+
+    def __init__(self, seq, timestamp, frame, gray, faces, scale=1.0, tracked=False):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.frame = frame
+        self.gray = gray
+        self.scale = scale
+        self.faces = faces
+        self.tracked = tracked
+
+    def detached(self, frame=None):
+        """Copy of this detection that owns its frame (for frames living in a reusable buffer).
+
+        ``frame`` is an already made copy, e.g. from ``CameraCapture.copy_frame()``.
+        """
+        frame = self.frame.copy() if frame is None else frame
+        return FrameDetection(self.seq, self.timestamp, frame, self.gray, self.faces, self.scale, self.tracked)
+
+    def largest_face(self):
+        """Return (x, y, w, h) of the largest face, or None."""
+        if len(self.faces) == 0:
+            return None
+        return max(self.faces, key=lambda f: f[2] * f[3])
+
+    def face_crop(self):
+        """Crop of the largest face (whole frame if none found)."""
+        roi = self.largest_face()
+        if roi is None:
+            return self.frame
+        x, y, w, h = roi
+        return self.frame[y:y+h, x:x+w]
+
+
+class FaceDetector:
+    """Finds the face in each frame at most once per frame sequence number and caches recent results.
+
+    In "tracking" mode the Haar cascade runs on a downscaled frame every
+    ``redetect_interval`` frames; in between, the last face is followed by
+    template matching inside a small search window, and a weak match triggers
+    an immediate re-detect. "full" mode runs the cascade on every full-size frame.
+    """
+
+    def __init__(self, scale_factor=None, min_neighbors=None, min_size=None, cache_size=None, cascade_path=None,
+                 mode=None, downscale=None, redetect_interval=None, track_min_score=None, search_margin=None):
+        self.cascade = cv2.CascadeClassifier(cascade_path or cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        self.scale_factor = scale_factor or ENGINE_DEFAULTS["face_detection_scale_factor"]
+        self.min_neighbors = min_neighbors or ENGINE_DEFAULTS["face_detection_min_neighbors"]
+        self.min_size = tuple(min_size or ENGINE_DEFAULTS["face_detection_min_size"])
+        self.cache_size = max(1, int(cache_size or ENGINE_DEFAULTS["detection_cache_size"]))
+        self.mode = mode or ENGINE_DEFAULTS["face_detection_mode"]
+        if self.mode == "tracking":
+            self.downscale = downscale or ENGINE_DEFAULTS["face_detection_downscale"]
+            self.redetect_interval = max(1, int(redetect_interval or ENGINE_DEFAULTS["face_redetect_interval"]))
+        else:
+            self.downscale = 1.0
+            self.redetect_interval = 1
+        self.track_min_score = track_min_score if track_min_score is not None else ENGINE_DEFAULTS["face_track_min_score"]
+        self.search_margin = search_margin if search_margin is not None else ENGINE_DEFAULTS["face_track_search_margin"]
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        # tracking state, in downscaled coordinates
+        self._template = None
+        self._track_box = None
+        self._frames_since_detect = self.redetect_interval
+        self.stats = {"cascade_runs": 0, "tracked_frames": 0, "track_lost": 0}
+        self.last_timings = {}                 # seconds spent per stage on the last detect() miss
+
+    def detect(self, frame, seq, timestamp=None):
+        """Return the FrameDetection for ``seq``, doing the work only on a cache miss."""
+        cached = self.get(seq)
+        if cached is not None:
+            return cached
+
+        t0 = time.perf_counter()
+        if self.downscale != 1.0:
+            small = cv2.resize(frame, None, fx=self.downscale, fy=self.downscale, interpolation=cv2.INTER_AREA)
+        else:
+            small = frame
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        t1 = time.perf_counter()
+
+        box, tracked = None, False
+        if self._track_box is not None and self._frames_since_detect < self.redetect_interval:
+            box = self._track(gray)
+            tracked = box is not None
+            if not tracked:
+                self.stats["track_lost"] += 1
+        if box is None and (self._track_box is not None or self._frames_since_detect >= self.redetect_interval):
+            box = self._run_cascade(gray)
+        else:
+            self._frames_since_detect += 1
+
+        faces = [self._to_full_res(box)] if box is not None else []
+        self.last_timings = {"cvtColor": t1 - t0, "cascade": time.perf_counter() - t1}
+        detection = FrameDetection(seq, timestamp if timestamp is not None else time.time(), frame, gray, faces,
+                                   scale=self.downscale, tracked=tracked)
+        with self._lock:
+            self._cache[seq] = detection
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return detection
+
+    def reset_tracking(self):
+        """Forget the tracked face and cached detections so the next frame runs the cascade."""
+        self.clear()
+        self._template = None
+        self._track_box = None
+        self._frames_since_detect = self.redetect_interval
+
+    # --- internals ---
+    def _run_cascade(self, gray):
+        self.stats["cascade_runs"] += 1
+        self._frames_since_detect = 1
+        min_size = (max(1, int(self.min_size[0] * self.downscale)), max(1, int(self.min_size[1] * self.downscale)))
+        faces = self.cascade.detectMultiScale(
+            gray,
+            scaleFactor=self.scale_factor,
+            minNeighbors=self.min_neighbors,
+            minSize=min_size
+        )
+        if len(faces) == 0:
+            self._template = None
+            self._track_box = None
+            return None
+        x, y, w, h = (int(v) for v in max(faces, key=lambda f: f[2] * f[3]))
+        if self.redetect_interval > 1:
+            self._template = gray[y:y+h, x:x+w].copy()
+            self._track_box = (x, y, w, h)
+        return (x, y, w, h)
+
+    def _track(self, gray):
+        """Template-match the last face inside a window around its previous position."""
+        x, y, w, h = self._track_box
+        mx, my = int(w * self.search_margin), int(h * self.search_margin)
+        x0, y0 = max(0, x - mx), max(0, y - my)
+        x1, y1 = min(gray.shape[1], x + w + mx), min(gray.shape[0], y + h + my)
+        window = gray[y0:y1, x0:x1]
+        if window.shape[0] < h or window.shape[1] < w:
+            return None
+        scores = cv2.matchTemplate(window, self._template, cv2.TM_CCOEFF_NORMED)
+        _, best, _, loc = cv2.minMaxLoc(scores)
+        if best < self.track_min_score:
+            return None
+        self.stats["tracked_frames"] += 1
+        self._track_box = (x0 + loc[0], y0 + loc[1], w, h)
+        return self._track_box
+
+    def _to_full_res(self, box):
+        if self.downscale == 1.0:
+            return box
+        inv = 1.0 / self.downscale
+        x, y, w, h = box
+        return (int(x * inv), int(y * inv), int(w * inv), int(h * inv))
+
+    def get(self, seq):
+        """Return the cached FrameDetection for ``seq`` or None."""
+        with self._lock:
+            return self._cache.get(seq)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+# ---------------------------
+# Model helpers
+# ---------------------------
+class DetectorBackendManager:
+    """Chooses the DeepFace detector backend for each call from measured latency and failures.
+
+    Untried backends are tried first (in configured order); after that the
+    available backend with the lowest average latency wins. A backend that
+    fails ``failure_threshold`` times in a row is skipped for ``cooldown``
+    seconds (circuit open) and then gets a single trial call again.
+    """
+
+    def __init__(self, backends=None, failure_threshold=3, cooldown=60.0):
+        self.backends = list(backends or ENGINE_DEFAULTS["detector_backends"])
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._stats = {
+            b: {"calls": 0, "failures": 0, "consecutive_failures": 0, "avg_latency": None, "open_until": 0.0, "last_error": None}
+            for b in self.backends
+        }
+
+    def candidates(self, now=None):
+        """Backends worth trying right now, best first."""
+        now = now if now is not None else time.time()
+        with self._lock:
+            available = [b for b in self.backends if self._stats[b]["open_until"] <= now]
+            if not available:
+                # every circuit is open: try the one whose cool-down ends first
+                return [min(self.backends, key=lambda b: self._stats[b]["open_until"])]
+            untried = [b for b in available if self._stats[b]["avg_latency"] is None]
+            tried = sorted((b for b in available if self._stats[b]["avg_latency"] is not None),
+                           key=lambda b: self._stats[b]["avg_latency"])
+            return untried + tried
+
+    def record_success(self, backend, latency):
+        with self._lock:
+            st = self._stats[backend]
+            st["calls"] += 1
+            st["consecutive_failures"] = 0
+            st["open_until"] = 0.0
+            st["avg_latency"] = latency if st["avg_latency"] is None else 0.8 * st["avg_latency"] + 0.2 * latency
+
+    def record_failure(self, backend, error=None):
+        with self._lock:
+            st = self._stats[backend]
+            st["calls"] += 1
+            st["failures"] += 1
+            st["consecutive_failures"] += 1
+            st["last_error"] = str(error) if error else None
+            if st["consecutive_failures"] >= self.failure_threshold:
+                st["open_until"] = time.time() + self.cooldown
+                print(f"Detector backend '{backend}' failing, skipping it for {self.cooldown:.0f}s.")
+
+    def get_stats(self):
+        now = time.time()
+        with self._lock:
+            return {
+                b: {
+                    "calls": st["calls"],
+                    "failures": st["failures"],
+                    "failure_rate": round(st["failures"] / st["calls"], 3) if st["calls"] else 0.0,
+                    "avg_latency_ms": round(st["avg_latency"] * 1000.0, 1) if st["avg_latency"] is not None else None,
+                    "circuit_open": st["open_until"] > now,
+                    "last_error": st["last_error"],
+                }
+                for b, st in self._stats.items()
+            }
+
+
+# One manager per process, shared by every caller that does not bring its own
+default_backend_manager = DetectorBackendManager()
+_batch_supported = None  # whether the installed DeepFace accepts a list of images
+
+
+def load_emotion_model(backend_manager=None):
+    """Builds the DeepFace emotion model (and detectors) once with a dummy forward pass."""
+    global _batch_supported
+    manager = backend_manager or default_backend_manager
+    DeepFace = _deepface()
+    blank = np.zeros((64, 64, 3), dtype=np.uint8)
+    for backend in manager.backends:
+        try:
+            DeepFace.analyze(blank, actions=['emotion'], enforce_detection=False, detector_backend=backend, silent=True)
+        except Exception as e:
+            manager.record_failure(backend, e)
+            print(f"Emotion model warm-up with '{backend}' failed: {e}")
+    try:
+        probe = DeepFace.analyze([blank, blank], actions=['emotion'], enforce_detection=False, detector_backend='skip', silent=True)
+        _batch_supported = isinstance(probe, list) and len(probe) == 2
+    except Exception:
+        _batch_supported = False
+    print(f"Emotion model loaded (batched analysis {'on' if _batch_supported else 'off'}).")
+
+
+def pick_emotion(analysis, emotions=None, confidence_threshold=None):
+    """Turns one DeepFace analysis dict into a result dict, or None if nothing usable."""
+    emotions = emotions or ENGINE_DEFAULTS["emotions"]
+    if confidence_threshold is None:
+        confidence_threshold = ENGINE_DEFAULTS["confidence_threshold"]
+    if isinstance(analysis, list):
+        if not analysis:
+            return None
+        analysis = analysis[0]
+    emotions_dict = analysis.get('emotion') or {}
+    if emotions_dict:
+        label, prob = max(emotions_dict.items(), key=lambda kv: kv[1])
+        if label in emotions and prob >= (confidence_threshold * 100.0):
+            return {"emotion": label, "scores": emotions_dict}
+    dom = analysis.get('dominant_emotion')
+    if dom in emotions:
+        return {"emotion": dom, "scores": emotions_dict}
+    return None
+
+
+def analyze_face(face_frame, backend_manager=None, max_attempts=2, emotions=None, confidence_threshold=None):
+    """Runs DeepFace on a face crop with the best available detector backend.
+
+    Falls back to the next candidate only when a call raises, and a backend
+    that keeps failing is skipped by the manager, so frames normally cost one
+    analysis. ``emotions`` and ``confidence_threshold`` go to ``pick_emotion``.
+    """
+    manager = backend_manager or default_backend_manager
+    DeepFace = _deepface()
+    last_error = None
+    for backend in manager.candidates()[:max_attempts]:
+        started = time.perf_counter()
+        try:
+            analysis = DeepFace.analyze(face_frame, actions=['emotion'], enforce_detection=False, detector_backend=backend, silent=True)
+        except Exception as e:
+            manager.record_failure(backend, e)
+            last_error = e
+            continue
+        manager.record_success(backend, time.perf_counter() - started)
+        return pick_emotion(analysis, emotions, confidence_threshold)
+    if last_error:
+        raise last_error
+    return None
+
+
+def analyze_faces_batch(face_frames, backend_manager=None, emotions=None, confidence_threshold=None):
+    """Runs one DeepFace call over a list of face crops; returns one result (or None) per crop.
+
+    Falls back to analysing the crops one by one when the installed DeepFace
+    cannot take a batch.
+    """
+    if not face_frames:
+        return []
+    if len(face_frames) == 1 or _batch_supported is False:
+        return [_analyze_face_safe(f, backend_manager, emotions, confidence_threshold) for f in face_frames]
+    manager = backend_manager or default_backend_manager
+    DeepFace = _deepface()
+    backend = manager.candidates()[0]
+    started = time.perf_counter()
+    try:
+        analyses = DeepFace.analyze(list(face_frames), actions=['emotion'], enforce_detection=False, detector_backend=backend, silent=True)
+    except Exception as e:
+        if _batch_supported:
+            manager.record_failure(backend, e)  # batching is known to work, so the backend failed
+        analyses = None
+    if isinstance(analyses, list) and len(analyses) == len(face_frames):
+        manager.record_success(backend, (time.perf_counter() - started) / len(face_frames))
+        return [pick_emotion(a, emotions, confidence_threshold) for a in analyses]
+    return [_analyze_face_safe(f, backend_manager, emotions, confidence_threshold) for f in face_frames]
+
+
+def _analyze_face_safe(face_frame, backend_manager=None, emotions=None, confidence_threshold=None):
+    try:
+        return analyze_face(face_frame, backend_manager, emotions=emotions, confidence_threshold=confidence_threshold)
+    except Exception as e:
+        print(f"Emotion analysis error: {e}")
+        return None
+
+
+# ---------------------------
+# Streaming aggregation
+# ---------------------------
+class EmotionAggregator:
+    """Time-decayed probability mass per emotion, updated in O(1) per result.
+
+    Every result adds its emotion probabilities (renormalised over the tracked
+    emotions, or a one-hot vote when no scores came back) to a fixed-size
+    array, after the mass already there has decayed by ``half_life`` seconds
+    of age. Nothing is stored per detection and nothing is allocated per
+    update. ``thresholds`` are per-emotion lock-in shares, which is where the
+    sensitive 'sad' rule lives.
+    """
+
+    def __init__(self, emotions=None, half_life=8.0, default_threshold=None, thresholds=None):
+        self.emotions = list(emotions or ENGINE_DEFAULTS["emotions"])
+        self._index = {e: i for i, e in enumerate(self.emotions)}
+        self.half_life = half_life
+        default_threshold = default_threshold or ENGINE_DEFAULTS["lock_in_share"]
+        if thresholds is None:
+            thresholds = {"sad": ENGINE_DEFAULTS["sad_lock_in_share"]}
+        self.thresholds = np.full(len(self.emotions), default_threshold, dtype=np.float64)
+        for emotion, share in thresholds.items():
+            if emotion in self._index and share is not None:
+                self.thresholds[self._index[emotion]] = share
+        self.mass = np.zeros(len(self.emotions), dtype=np.float64)
+        self._scratch = np.zeros(len(self.emotions), dtype=np.float64)
+        self.reset()
+
+    def reset(self):
+        self.mass.fill(0.0)
+        self.weight = 0.0                      # decayed number of results (== mass.sum())
+        self.count = 0                         # raw number of results
+        self.last_ts = None
+
+    def update(self, emotion, scores=None, ts=None):
+        """Fold one result into the mass. ``scores`` are DeepFace percentages."""
+        ts = ts if ts is not None else time.time()
+        scratch = self._scratch
+        total = 0.0
+        if scores:
+            for i, e in enumerate(self.emotions):
+                value = float(scores.get(e, 0.0))
+                scratch[i] = value
+                total += value
+        if total > 0.0:
+            scratch /= total
+        else:
+            index = self._index.get(emotion)
+            if index is None:
+                return
+            scratch.fill(0.0)
+            scratch[index] = 1.0
+
+        weight = 1.0
+        if self.last_ts is None:
+            self.last_ts = ts
+        elif self.half_life:
+            if ts >= self.last_ts:
+                decay = 0.5 ** ((ts - self.last_ts) / self.half_life)
+                self.mass *= decay
+                self.weight *= decay
+                self.last_ts = ts
+            else:
+                # late result from a slower worker: it is already that much older
+                weight = 0.5 ** ((self.last_ts - ts) / self.half_life)
+                scratch *= weight
+        self.mass += scratch
+        self.weight += weight
+        self.count += 1
+
+    def threshold(self, emotion):
+        index = self._index.get(emotion)
+        return float(self.thresholds[index]) if index is not None else float(self.thresholds.max())
+
+    def confidence(self):
+        """Return (leading emotion, its share of the mass, effective sample size)."""
+        if self.weight <= 0.0:
+            return None, 0.0, 0.0
+        index = int(self.mass.argmax())
+        return self.emotions[index], float(self.mass[index] / self.weight), self.weight
+
+    def decision(self, verbose=True):
+        """The leader if its share clears its threshold, otherwise 'neutral'."""
+        leader, share, _ = self.confidence()
+        if leader is None:
+            return "neutral"
+        threshold = self.threshold(leader)
+        if share >= threshold:
+            if verbose:
+                rule = "sensitive" if threshold < self.thresholds.max() else "standard"
+                print(f"Confident emotion found ({rule} rule): {leader} ({share:.0%})")
+            return leader
+        if verbose:
+            print(f"No confident emotion found (Top was {leader} at {share:.0%}). Defaulting to neutral.")
+        return "neutral"
+
+
+# ---------------------------
+# Inference worker pool
+# ---------------------------
+class EmotionInferencePool:
+    """Fixed-size pool of warm inference workers fed through a bounded frame queue.
+
+    Frames are submitted with their capture timestamp. When the queue is full the
+    oldest pending frame is dropped, and frames older than ``max_frame_age`` are
+    skipped by the workers, so a slow model never builds up a backlog.
+
+    Each worker gathers up to ``batch_size`` frames, or whatever arrived within
+    ``batch_timeout`` seconds of the first one, turns them into face crops with
+    ``prepare_fn`` and hands the whole micro-batch to ``batch_fn`` in one call.
+    Every result put on ``result_queue`` carries the ``frame_ts`` of its source frame.
+    """
+
+    def __init__(self, prepare_fn, batch_fn, result_queue, num_workers=1, max_pending=16, max_frame_age=1.5,
+                 batch_size=8, batch_timeout=0.25, warm_up_fn=load_emotion_model):
+        self.prepare_fn = prepare_fn
+        self.batch_fn = batch_fn
+        self.result_queue = result_queue
+        self.num_workers = max(1, int(num_workers))
+        self.max_frame_age = max_frame_age
+        self.batch_size = max(1, int(batch_size))
+        self.batch_timeout = batch_timeout
+        self.warm_up_fn = warm_up_fn
+        self._frames = queue.Queue(maxsize=max(1, int(max_pending)))
+        self._workers = []
+        self._running = False
+        self._ready = threading.Event()
+        self._stats_lock = threading.Lock()
+        self.stats = {"submitted": 0, "dropped_full": 0, "dropped_stale": 0, "completed": 0, "errors": 0, "batches": 0}
+        self.frame_latency = None              # EMA of inference seconds per frame
+
+    @property
+    def is_ready(self):
+        return self._ready.is_set()
+
+    def start(self):
+        """Loads the model in the background and starts the worker threads."""
+        if self._running:
+            return
+        self._running = True
+        threading.Thread(target=self._warm_up, name="emotion-warmup", daemon=True).start()
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"emotion-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self):
+        """Stops the workers; pending frames are discarded."""
+        self._running = False
+        self._ready.set()
+        self.flush()
+        for _ in self._workers:
+            try:
+                self._frames.put_nowait(None)
+            except queue.Full:
+                break
+        self._workers = []
+
+    def submit(self, frame, frame_ts=None):
+        """Queues a frame for analysis without blocking. Returns False if the pool is stopped."""
+        if not self._running:
+            return False
+        item = (frame, frame_ts if frame_ts is not None else time.time())
+        self._bump("submitted")
+        while True:
+            try:
+                self._frames.put_nowait(item)
+                return True
+            except queue.Full:
+                try:
+                    self._frames.get_nowait()  # drop the oldest pending frame
+                    self._bump("dropped_full")
+                except queue.Empty:
+                    pass
+
+    def flush(self):
+        """Discards frames that have not been picked up yet."""
+        try:
+            while True:
+                self._frames.get_nowait()
+        except queue.Empty:
+            pass
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["pending"] = self._frames.qsize()
+        stats["avg_batch_size"] = (stats["completed"] / stats["batches"]) if stats["batches"] else 0.0
+        stats["ready"] = self.is_ready
+        stats["latency_ms_per_frame"] = round(self.frame_latency * 1000.0, 1) if self.frame_latency else None
+        return stats
+
+    # --- internals ---
+    def _bump(self, key, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def _warm_up(self):
+        try:
+            if self.warm_up_fn:
+                self.warm_up_fn()
+        except Exception as e:
+            print(f"Emotion model warm-up error: {e}")
+        finally:
+            self._ready.set()
+
+    def _collect_batch(self):
+        """Blocks briefly for one frame, then gathers more until the batch is full or times out."""
+        try:
+            first = self._frames.get(timeout=0.2)
+        except queue.Empty:
+            return []
+        batch = [first] if first is not None else []
+        deadline = time.time() + self.batch_timeout
+        while self._running and len(batch) < self.batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                item = self._frames.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is not None:
+                batch.append(item)
+        return batch
+
+    def _worker_loop(self):
+        self._ready.wait()
+        while self._running:
+            batch = self._collect_batch()
+            if not batch:
+                continue
+
+            now = time.time()
+            fresh = [(frame, ts) for frame, ts in batch if now - ts <= self.max_frame_age]
+            if len(fresh) < len(batch):
+                self._bump("dropped_stale", len(batch) - len(fresh))
+            if not fresh:
+                continue
+
+            started = time.perf_counter()
+            try:
+                crops = [self.prepare_fn(frame) for frame, _ in fresh]
+                results = self.batch_fn(crops)
+            except Exception as e:
+                self._bump("errors")
+                print(f"Emotion analysis error: {e}")
+                continue
+            per_frame = (time.perf_counter() - started) / len(fresh)
+            with self._stats_lock:
+                self.frame_latency = per_frame if self.frame_latency is None else 0.8 * self.frame_latency + 0.2 * per_frame
+            self._bump("batches")
+            self._bump("completed", len(fresh))
+
+            for (_, frame_ts), result in zip(fresh, results):
+                if result:
+                    result["frame_ts"] = frame_ts
+                    self.result_queue.put(result)
+
+
+# ---------------------------
+# Adaptive analysis cadence
+# ---------------------------
+def wilson_lower_bound(successes, total, z=1.96):
+    """Lower bound of the Wilson score interval for a binomial proportion."""
+    if total <= 0:
+        return 0.0
+    p = successes / total
+    denom = 1.0 + z * z / total
+    center = p + z * z / (2.0 * total)
+    margin = z * math.sqrt(p * (1.0 - p) / total + z * z / (4.0 * total * total))
+    return (center - margin) / denom
+
+
+class AdaptiveAnalysisScheduler:
+    """Chooses how often to analyse a frame and when a detection run can stop early.
+
+    The interval follows the measured per-frame inference latency divided by
+    the number of workers that can actually run in parallel on this machine,
+    with some headroom so the queue does not grow. Early lock-in runs a
+    sequential test after every new detection: once the Wilson lower bound of
+    the leading emotion's share clears that emotion's lock-in threshold, the
+    result would not plausibly change by waiting for the full window.
+    """
+
+    def __init__(self, base_interval=0.5, min_interval=0.1, max_interval=2.0, workers=1, headroom=1.25,
+                 min_detections=6, min_seconds=2.0, z=1.96):
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.parallelism = max(1, min(int(workers), os.cpu_count() or 1))
+        self.headroom = headroom
+        self.min_detections = min_detections
+        self.min_seconds = min_seconds
+        self.z = z
+
+    def interval(self, frame_latency):
+        """Seconds between analysed frames given the current per-frame latency (None = unknown)."""
+        if not frame_latency:
+            return self.base_interval
+        target = frame_latency * self.headroom / self.parallelism
+        return max(self.min_interval, min(self.max_interval, target))
+
+    def early_decision(self, aggregator, elapsed):
+        """Return the emotion to lock in now, or None to keep collecting.
+
+        The effective (decayed) sample size of ``aggregator`` is the trial count.
+        """
+        if aggregator.count < self.min_detections or elapsed < self.min_seconds:
+            return None
+        leader, share, n = aggregator.confidence()
+        if leader is None:
+            return None
+        if wilson_lower_bound(share * n, n, self.z) >= aggregator.threshold(leader):
+            return leader
+        return None
+
+
+# ---------------------------
+# Headless detection engine
+# ---------------------------
+class EmotionEngine:
+    """Tk-free emotion detection session: frames in, emotion events out.
+
+    ``feed()`` takes one frame at a time and returns the events it produced;
+    ``stream()`` wraps it as a generator over any iterable of frames. Events are
+    dicts with ``type`` "detection" (one analysed frame) or "locked" (the
+    session's final emotion, after which the engine stops until ``reset()``).
+
+    Inference and aggregation are separate steps so they can run in different
+    places: ``analyze_frame()`` is stateless per frame (a worker process can run
+    it), while ``add_result()`` and ``check()`` keep the detection window.
+    """
+
+    def __init__(self, detector=None, scheduler=None, detection_duration=20, half_life=8.0,
+                 lock_in_share=None, sad_lock_in_share=None, early_lock=True, backend_manager=None,
+                 emotions=None, confidence_threshold=None):
+        self.detector = detector
+        self.scheduler = scheduler or AdaptiveAnalysisScheduler()
+        self.emotions = list(emotions or ENGINE_DEFAULTS["emotions"])
+        self.confidence_threshold = confidence_threshold
+        self.aggregator = EmotionAggregator(
+            emotions=self.emotions,
+            half_life=half_life,
+            default_threshold=lock_in_share,
+            thresholds={"sad": sad_lock_in_share or ENGINE_DEFAULTS["sad_lock_in_share"]},
+        )
+        self.detection_duration = detection_duration
+        self.early_lock = early_lock
+        self.backend_manager = backend_manager
+        self.frame_latency = None
+        self.reset()
+
+    def reset(self, start_ts=None):
+        """Start a new detection window (at ``start_ts``, or at the first frame fed)."""
+        self.window_start = start_ts
+        self.aggregator.reset()
+        self.locked = None
+        self._seq = 0
+        self._last_analysis_ts = 0.0
+
+    # --- inference ---
+    def analyze_frame(self, frame, frame_ts=None):
+        """Detect, crop and classify one frame. Returns a result dict or None."""
+        if self.detector is None:
+            self.detector = FaceDetector(mode="full")
+        self._seq += 1
+        detection = self.detector.detect(frame, self._seq, frame_ts)
+        started = time.perf_counter()
+        result = analyze_faces_batch([detection.face_crop()], self.backend_manager,
+                                     self.emotions, self.confidence_threshold)[0]
+        elapsed = time.perf_counter() - started
+        self.frame_latency = elapsed if self.frame_latency is None else 0.8 * self.frame_latency + 0.2 * elapsed
+        if result:
+            result["frame_ts"] = detection.timestamp
+            result["face"] = [int(v) for v in detection.largest_face()] if detection.faces else None
+        return result
+
+    # --- aggregation ---
+    def add_result(self, result):
+        """Add one inference result to the window; returns the events it produced."""
+        if not result or self.locked or self.window_start is None or result["frame_ts"] < self.window_start:
+            return []
+        self.aggregator.update(result["emotion"], result.get("scores"), result["frame_ts"])
+        leader, share, _ = self.aggregator.confidence()
+        return [{"type": "detection", "emotion": result["emotion"], "frame_ts": result["frame_ts"],
+                 "leader": leader, "confidence": round(share, 3)}]
+
+    def check(self, now=None):
+        """Return a "locked" event once the window can close (early or at the deadline), else None."""
+        if self.locked or self.window_start is None:
+            return None
+        now = now if now is not None else time.time()
+        elapsed = now - self.window_start
+        emotion, reason = None, None
+        if self.early_lock and self.aggregator.count:
+            emotion = self.scheduler.early_decision(self.aggregator, elapsed)
+            reason = "early"
+        if emotion is None and elapsed >= self.detection_duration:
+            emotion = self.aggregator.decision()
+            reason = "timeout" if self.aggregator.count else "no_face"
+        if emotion is None:
+            return None
+        self.locked = emotion
+        _, share, _ = self.aggregator.confidence()
+        return {"type": "locked", "emotion": emotion, "reason": reason, "confidence": round(share, 3),
+                "elapsed": round(elapsed, 2), "detections": self.aggregator.count}
+
+    def analysis_interval(self):
+        return self.scheduler.interval(self.frame_latency)
+
+    # --- streaming API ---
+    def feed(self, frame, frame_ts=None):
+        """Process one frame synchronously and return the new events."""
+        frame_ts = frame_ts if frame_ts is not None else time.time()
+        if self.locked:
+            return []
+        if self.window_start is None:
+            self.window_start = frame_ts
+        events = []
+        if frame_ts - self._last_analysis_ts >= self.analysis_interval():
+            self._last_analysis_ts = frame_ts
+            events.extend(self.add_result(self.analyze_frame(frame, frame_ts)))
+        locked = self.check(frame_ts)
+        if locked:
+            events.append(locked)
+        return events
+
+    def stream(self, frames):
+        """Yield events for an iterable of frames or (frame, timestamp) pairs until an emotion locks in."""
+        for item in frames:
+            frame, frame_ts = item if isinstance(item, tuple) else (item, None)
+            for event in self.feed(frame, frame_ts):
+                yield event
+            if self.locked:
+                return
@@ -0,0 +1,169 @@
+# emotion_service.py
+"""
+Multi-process emotion detection for the web server.
+
+Each worker process loads the emotion model once (pool initializer) and runs
+the stateless per-frame part of EmotionEngine (face detection, crop,
+DeepFace). The detection window and lock-in decision for each client stay in
+the server process, in one lightweight EmotionEngine per client, so any
+worker can serve any frame.
+"""
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from emotion_engine import EmotionEngine, default_backend_manager, load_emotion_model
+
+_worker_engine = None
+
+
+def _init_worker():
+    """Runs once in every worker process: load the model and build a detector."""
+    global _worker_engine
+    load_emotion_model()
+    _worker_engine = EmotionEngine()
+    print(f"Emotion worker {os.getpid()} ready.")
+
+
+def _analyze_encoded_frame(image_bytes, frame_ts):
+    """Decode a JPEG/PNG frame and analyse it in a worker process."""
+    started = time.perf_counter()
+    frame = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    result = None
+    if frame is not None:
+        result = _worker_engine.analyze_frame(frame, frame_ts)
+    return {"pid": os.getpid(), "result": result, "latency": time.perf_counter() - started,
+            "backends": default_backend_manager.get_stats()}
+
+
+class EmotionService:
+    """Runs frame analysis for many clients on a process pool.
+
+    ``submit_frame()`` never blocks: each client may have at most
+    ``max_in_flight`` frames being analysed and extra frames are dropped.
+    Events for a client are delivered through ``on_events(client_id, events)``
+    from a pool callback thread.
+    """
+
+    def __init__(self, workers=None, max_in_flight=2, engine_options=None):
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self.max_in_flight = max_in_flight
+        self.engine_options = engine_options or {}
+        self._executor = None
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._started_at = None
+        self._worker_stats = {}
+        self.stats = {"frames_submitted": 0, "frames_dropped": 0, "frames_analyzed": 0, "errors": 0}
+
+    def start(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn, not fork: the server already runs threads whose locks a forked child could inherit held
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+                self._started_at = time.time()
+                print(f"Emotion service started with {self.workers} worker processes.")
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    # --- sessions ---
+    def open_session(self, client_id):
+        """Start (or restart) a detection window for a client."""
+        with self._lock:
+            engine = EmotionEngine(**self.engine_options)
+            engine.reset(time.time())
+            self._sessions[client_id] = {"engine": engine, "in_flight": 0}
+
+    def close_session(self, client_id):
+        with self._lock:
+            self._sessions.pop(client_id, None)
+
+    def submit_frame(self, client_id, image_bytes, on_events, frame_ts=None):
+        """Queue one encoded frame for a client. Returns False if it was dropped."""
+        self.start()
+        frame_ts = frame_ts if frame_ts is not None else time.time()
+        with self._lock:
+            session = self._sessions.get(client_id)
+            if session is None or session["engine"].locked:
+                return False
+            self.stats["frames_submitted"] += 1
+            if session["in_flight"] >= self.max_in_flight:
+                self.stats["frames_dropped"] += 1
+                return False
+            session["in_flight"] += 1
+            executor = self._executor
+
+        try:
+            future = executor.submit(_analyze_encoded_frame, image_bytes, frame_ts)
+        except Exception as e:                          # pool shut down or broken: give the slot back
+            with self._lock:
+                self.stats["errors"] += 1
+                session = self._sessions.get(client_id)
+                if session:
+                    session["in_flight"] -= 1
+            print(f"Emotion service could not queue a frame for {client_id}: {e}")
+            return False
+        future.add_done_callback(lambda f: self._on_done(client_id, f, on_events))
+        return True
+
+    def _on_done(self, client_id, future, on_events):
+        try:
+            outcome = future.result()
+        except Exception as e:
+            with self._lock:
+                self.stats["errors"] += 1
+                session = self._sessions.get(client_id)
+                if session:
+                    session["in_flight"] -= 1
+            print(f"Emotion service error for {client_id}: {e}")
+            return
+
+        with self._lock:
+            self.stats["frames_analyzed"] += 1
+            worker = self._worker_stats.setdefault(outcome["pid"], {"frames": 0, "total_latency": 0.0})
+            worker["frames"] += 1
+            worker["total_latency"] += outcome["latency"]
+            worker["backends"] = outcome["backends"]
+            session = self._sessions.get(client_id)
+            if session is None:
+                return
+            session["in_flight"] -= 1
+            engine = session["engine"]
+            events = engine.add_result(outcome["result"])
+            locked = engine.check()
+            if locked:
+                events.append(locked)
+        if events:
+            on_events(client_id, events)
+
+    # --- metrics ---
+    def get_metrics(self):
+        with self._lock:
+            uptime = time.time() - self._started_at if self._started_at else 0.0
+            workers = {
+                str(pid): {
+                    "frames": w["frames"],
+                    "avg_latency_ms": round(w["total_latency"] / w["frames"] * 1000.0, 1) if w["frames"] else None,
+                    "backends": w.get("backends", {}),
+                }
+                for pid, w in self._worker_stats.items()
+            }
+            metrics = dict(self.stats)
+            metrics.update({
+                "workers": self.workers,
+                "active_sessions": len(self._sessions),
+                "uptime_seconds": round(uptime, 1),
+                "frames_per_second": round(self.stats["frames_analyzed"] / uptime, 2) if uptime else 0.0,
+                "per_worker": workers,
+            })
+        return metrics
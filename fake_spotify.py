@@ -0,0 +1,344 @@
+# fake_spotify.py
+"""
+Local stand-in for the parts of the Spotify Web API this app uses.
+
+Serves recorded fixtures (fixtures/spotify.json) for ``/v1/me``, devices,
+playback, search and playlist details, with configurable latency, jitter and
+injected 5xx / 429 responses, so recommendations and the ``/spotify/*``
+routes can be benchmarked without api.spotify.com:
+
+    python fake_spotify.py --port 8900 --latency-ms 120 --jitter-ms 40 --error-rate 0.02
+    SPOTIFY_API_BASE=http://127.0.0.1:8900/v1 SPOTIFY_ACCOUNTS_BASE=http://127.0.0.1:8900 python app.py
+
+Searches that are not recorded get deterministic synthetic playlists, some
+of which deliberately do not match the query. ``/_fake/config`` (POST JSON)
+changes latency and fault injection at runtime, ``/_fake/stats`` returns
+call counts per endpoint and ``/_fake/reset`` clears them.
+"""
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from collections import Counter
+
+from flask import Flask, Response, jsonify, request
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "spotify.json")
+
+# Words mixed into synthesized playlist names
+_FILLER = ["hits", "essentials", "mix", "radio", "classics", "top 50", "workout", "focus", "party"]
+
+
+class FaultConfig:
+    """Latency and fault injection applied to every API request."""
+
+    FIELDS = ("latency_ms", "jitter_ms", "error_rate", "rate_limit_rate", "retry_after")
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, rate_limit_rate=0.0, retry_after=1, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def update(self, values):
+        with self.lock:
+            for field in self.FIELDS:
+                if field in values:
+                    setattr(self, field, type(getattr(self, field))(values[field]))
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def draw(self):
+        """(delay seconds, injected status or None) for one request."""
+        with self.lock:
+            delay = max(0.0, self.latency_ms + self.rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000.0
+            roll = self.rng.random()
+        if roll < self.rate_limit_rate:
+            return delay, 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return delay, 500
+        return delay, None
+
+
+class FakePlayer:
+    """Playback state that advances through the fixture tracks in real time."""
+
+    def __init__(self, tracks):
+        self.tracks = tracks
+        self.lock = threading.Lock()
+        self.context_uri = None
+        self.device_id = None
+        self.index = 0
+        self.offset_ms = 0
+        self.started_at = None                 # None while paused
+
+    def _advance(self, now):
+        if self.started_at is None or not self.tracks:
+            return
+        progress = self.offset_ms + (now - self.started_at) * 1000.0
+        while progress >= self.tracks[self.index]["duration_ms"]:
+            progress -= self.tracks[self.index]["duration_ms"]
+            self.index = (self.index + 1) % len(self.tracks)
+        self.offset_ms, self.started_at = progress, now
+
+    def play(self, device_id=None, context_uri=None, offset_uri=None, position_ms=None):
+        with self.lock:
+            now = time.time()
+            self._advance(now)
+            if context_uri:
+                self.context_uri, self.index, self.offset_ms = context_uri, 0, 0
+            if offset_uri:
+                uris = [t["uri"] for t in self.tracks]
+                self.index, self.offset_ms = (uris.index(offset_uri) if offset_uri in uris else 0), 0
+            if position_ms is not None:
+                self.offset_ms = position_ms
+            self.device_id = device_id or self.device_id
+            self.started_at = now
+
+    def pause(self):
+        with self.lock:
+            self._advance(time.time())
+            self.started_at = None
+
+    def skip(self, step):
+        with self.lock:
+            self._advance(time.time())
+            self.index = (self.index + step) % len(self.tracks)
+            self.offset_ms = 0
+            if self.started_at is not None:
+                self.started_at = time.time()
+
+    def current(self, devices):
+        with self.lock:
+            if self.context_uri is None or not self.tracks:
+                return None
+            self._advance(time.time())
+            device = next((d for d in devices if d["id"] == self.device_id), devices[0] if devices else None)
+            return {
+                "device": device,
+                "is_playing": self.started_at is not None,
+                "progress_ms": int(self.offset_ms),
+                "item": self.tracks[self.index],
+                "context": {"type": "playlist", "uri": self.context_uri},
+                "currently_playing_type": "track",
+            }
+
+
+class FakeSpotify:
+    """Fixture data plus call counters; ``create_app`` wraps it in a Flask app."""
+
+    def __init__(self, fixtures_path=DEFAULT_FIXTURES, faults=None):
+        with open(fixtures_path) as f:
+            fixtures = json.load(f)
+        self.me = fixtures["me"]
+        self.devices = fixtures["devices"]
+        self.searches = {q.lower(): ids for q, ids in fixtures.get("searches", {}).items()}
+        self.playlists = {pid: self._playlist(pid, p) for pid, p in fixtures.get("playlists", {}).items()}
+        self.player = FakePlayer(fixtures.get("tracks", []))
+        self.faults = faults or FaultConfig()
+        self.calls = Counter()
+        self.injected = Counter()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _playlist(pid, data):
+        playlist = {"id": pid, "uri": f"spotify:playlist:{pid}", "type": "playlist",
+                    "external_urls": {"spotify": f"https://open.spotify.com/playlist/{pid}"},
+                    "description": "", "followers": {"total": 0}}
+        playlist.update(data)
+        return playlist
+
+    def search_ids(self, query, limit):
+        """Recorded ids for ``query``, else a deterministic synthetic result page."""
+        query = " ".join(query.lower().split())
+        if query in self.searches:
+            return self.searches[query][:limit]
+        # word order and "playlist"/"vibes" do not matter, so related queries overlap like real ones
+        words = sorted(set(query.split()) - {"playlist", "vibes"})
+        ids = []
+        for i in range(limit):
+            pid = hashlib.sha1(f"{' '.join(words)}:{i}".encode()).hexdigest()[:22]
+            if pid not in self.playlists:
+                rng = random.Random(pid)
+                filler = rng.choice(_FILLER)
+                relevant = rng.random() < 0.6
+                name = " ".join(w.title() for w in words) + f" {filler.title()}" if relevant else f"{filler.title()} Playlist"
+                self.playlists[pid] = self._playlist(pid, {
+                    "name": name,
+                    "description": f"Synthetic {' '.join(words)} playlist" if relevant else "Synthetic playlist",
+                    "followers": {"total": int(rng.paretovariate(1.2) * 1000)},
+                })
+            ids.append(pid)
+        return ids
+
+    def count(self, endpoint):
+        with self.lock:
+            self.calls[endpoint] += 1
+
+    def stats(self):
+        with self.lock:
+            return {"calls": dict(self.calls), "total_calls": sum(self.calls.values()),
+                    "injected": dict(self.injected), "config": self.faults.as_dict()}
+
+    def reset(self):
+        with self.lock:
+            self.calls.clear()
+            self.injected.clear()
+
+
+def _error(status, message, headers=None):
+    return Response(json.dumps({"error": {"status": status, "message": message}}), status=status,
+                    mimetype="application/json", headers=headers)
+
+
+def create_app(fake):
+    app = Flask(__name__)
+    app.url_map.strict_slashes = False             # spotipy calls e.g. "me/" as well as "me/player"
+
+    @app.before_request
+    def inject():
+        if request.path.startswith("/_fake/"):
+            return None
+        endpoint = f"{request.method} {request.url_rule.rule if request.url_rule else request.path}"
+        fake.count(endpoint)
+        delay, status = fake.faults.draw()
+        if delay:
+            time.sleep(delay)
+        if request.path.startswith("/v1/") and not request.headers.get("Authorization", "").startswith("Bearer "):
+            return _error(401, "No token provided")
+        if status is not None:
+            with fake.lock:
+                fake.injected[status] += 1
+            if status == 429:
+                return _error(429, "API rate limit exceeded", {"Retry-After": str(fake.faults.retry_after)})
+            return _error(status, "Injected server error")
+        return None
+
+    @app.route("/api/token", methods=["POST"])
+    def token():
+        return jsonify({"access_token": "fake-" + os.urandom(8).hex(), "token_type": "Bearer", "expires_in": 3600,
+                        "scope": request.form.get("scope", "")})
+
+    @app.route("/v1/me")
+    def me():
+        return jsonify(fake.me)
+
+    @app.route("/v1/me/player/devices")
+    def devices():
+        return jsonify(fake.devices)
+
+    @app.route("/v1/me/player")
+    def playback():
+        current = fake.player.current(fake.devices.get("devices", []))
+        return jsonify(current) if current else Response(status=204)
+
+    @app.route("/v1/me/player/play", methods=["PUT"])
+    def play():
+        body = request.get_json(silent=True) or {}
+        fake.player.play(request.args.get("device_id"), body.get("context_uri"),
+                         (body.get("offset") or {}).get("uri"), body.get("position_ms"))
+        return Response(status=204)
+
+    @app.route("/v1/me/player/pause", methods=["PUT"])
+    def pause():
+        fake.player.pause()
+        return Response(status=204)
+
+    @app.route("/v1/me/player/next", methods=["POST"])
+    def next_track():
+        fake.player.skip(1)
+        return Response(status=204)
+
+    @app.route("/v1/me/player/previous", methods=["POST"])
+    def previous_track():
+        fake.player.skip(-1)
+        return Response(status=204)
+
+    @app.route("/v1/search")
+    def search():
+        if request.args.get("type") != "playlist":
+            return _error(400, "Only playlist search is faked")
+        limit = min(50, max(1, request.args.get("limit", 10, type=int)))
+        items = [fake.playlists[pid] for pid in fake.search_ids(request.args.get("q", ""), limit)]
+        return jsonify({"playlists": {"items": items, "limit": limit, "offset": 0, "total": len(items)}})
+
+    @app.route("/v1/playlists/<playlist_id>")
+    def playlist(playlist_id):
+        if playlist_id not in fake.playlists:
+            return _error(404, "Not found.")
+        return jsonify(fake.playlists[playlist_id])
+
+    @app.route("/_fake/stats")
+    def stats():
+        return jsonify(fake.stats())
+
+    @app.route("/_fake/reset", methods=["POST"])
+    def reset():
+        fake.reset()
+        return jsonify(fake.stats())
+
+    @app.route("/_fake/config", methods=["POST"])
+    def config():
+        fake.faults.update(request.get_json(silent=True) or {})
+        return jsonify(fake.faults.as_dict())
+
+    return app
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class FakeSpotifyServer(threading.Thread):
+    """Runs the fake API in a background thread; ``url`` is its base URL (port 0 picks a free port)."""
+
+    def __init__(self, fake=None, host="127.0.0.1", port=0, quiet=True):
+        super().__init__(name="fake-spotify", daemon=True)
+        self.fake = fake or FakeSpotify()
+        self.server = make_server(host, port, create_app(self.fake), threaded=True,
+                                  request_handler=_QuietHandler if quiet else None)
+        self.url = f"http://{host}:{self.server.server_port}"
+
+    def run(self):
+        self.server.serve_forever()
+
+    def shutdown(self):
+        self.server.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a local fake of the Spotify Web API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with HTTP 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests answered with HTTP 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds on injected 429s")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--quiet", action="store_true", help="do not log each request")
+    args = parser.parse_args(argv)
+
+    faults = FaultConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate, args.retry_after,
+                         seed=args.seed)
+    server = FakeSpotifyServer(FakeSpotify(args.fixtures, faults), args.host, args.port, quiet=args.quiet)
+    print(f"Fake Spotify API on {server.url}/v1 (token endpoint {server.url}/api/token)")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    sys.exit(main())
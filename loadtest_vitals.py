@@ -0,0 +1,220 @@
+# loadtest_vitals.py
+"""
+Load test for the hardware vitals path.
+
+Opens N simulated ESP32 clients on the /hardware namespace that send
+``vitals_update`` at a fixed rate, plus logged-in watcher clients that receive
+``vitals_from_server`` like the vitals player does, and idle web clients on the
+default namespace. Prints a JSON report with end-to-end latency (send ->
+``vitals_from_server`` receipt) and the server process' CPU and memory:
+
+    python loadtest_vitals.py --email me@example.com --password secret --devices 50 --rate 10
+    python loadtest_vitals.py --email me@example.com --password secret --server-pid 12345 --output load.json
+
+Start the server first, e.g. ``SOCKETIO_ASYNC_MODE=eventlet python app.py``.
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from urllib.parse import urlparse
+
+import numpy as np
+import psutil
+import socketio
+
+from bench_common import login, pair_device, summarize, unpair_device
+
+
+def find_server_pid(port):
+    """PID of the process listening on ``port``, if it can be found."""
+    try:
+        for conn in psutil.net_connections(kind="tcp"):
+            if conn.status == psutil.CONN_LISTEN and conn.laddr and conn.laddr.port == port and conn.pid:
+                return conn.pid
+    except psutil.AccessDenied:
+        pass
+    return None
+
+
+class ServerMonitor(threading.Thread):
+    """Samples CPU and RSS of the server process once per ``interval`` seconds."""
+
+    def __init__(self, pid, interval=1.0):
+        super().__init__(name="server-monitor", daemon=True)
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.cpu = []
+        self.rss = []
+        self._done = threading.Event()
+
+    def run(self):
+        self.process.cpu_percent(None)
+        while not self._done.wait(self.interval):
+            try:
+                with self.process.oneshot():
+                    self.cpu.append(self.process.cpu_percent(None))
+                    self.rss.append(self.process.memory_info().rss)
+            except psutil.Error:
+                return
+
+    def stop(self):
+        self._done.set()
+
+    def report(self):
+        if not self.cpu:
+            return {"pid": self.process.pid, "samples": 0}
+        return {
+            "pid": self.process.pid,
+            "samples": len(self.cpu),
+            "cpu_percent_avg": round(float(np.mean(self.cpu)), 1),
+            "cpu_percent_max": round(float(np.max(self.cpu)), 1),
+            "rss_mb_start": round(self.rss[0] / (1024 * 1024), 1),
+            "rss_mb_max": round(max(self.rss) / (1024 * 1024), 1),
+        }
+
+
+def run_load_test(url, email, password, devices=10, rate=5.0, duration=30.0, watchers=1, web_clients=0,
+                  server_pid=None, connect_timeout=10.0):
+    cookie = login(url, email, password)
+    lock = threading.Lock()
+    latencies = []
+    stats = {"sent": 0, "received": 0, "connect_errors": 0, "send_errors": 0}
+    clients = []
+
+    def connect(client, namespaces, **kwargs):
+        try:
+            client.connect(url, namespaces=namespaces, wait_timeout=connect_timeout, **kwargs)
+            clients.append(client)
+            return True
+        except socketio.exceptions.ConnectionError as e:
+            with lock:
+                stats["connect_errors"] += 1
+            print(f"Connect failed: {e}")
+            return False
+
+    # watchers: logged-in browsers receiving the user's room
+    def on_vitals(data):
+        now = time.time()
+        client_ts = data.get("client_ts")
+        with lock:
+            stats["received"] += 1
+            if client_ts:
+                latencies.append(now - client_ts)
+
+    for _ in range(watchers):
+        watcher = socketio.Client(reconnection=False)
+        watcher.on("vitals_from_server", on_vitals, namespace="/hardware")
+        connect(watcher, ["/hardware"], headers={"Cookie": cookie})
+
+    # idle web clients on the default namespace
+    for _ in range(web_clients):
+        connect(socketio.Client(reconnection=False), ["/"], headers={"Cookie": cookie})
+
+    monitor = None
+    server_pid = server_pid or find_server_pid(urlparse(url).port or 80)
+    if server_pid:
+        monitor = ServerMonitor(server_pid)
+        monitor.start()
+    else:
+        print("Server process not found; pass --server-pid to record CPU and memory.")
+
+    stop = threading.Event()
+    interval = 1.0 / rate
+    device_auth = []
+
+    def device_loop(index):
+        device = socketio.Client(reconnection=False)
+        if not connect(device, ["/hardware"], auth=device_auth[index]):
+            return
+        bpm, hrv = random.uniform(60, 110), random.uniform(20, 50)
+        stop.wait(random.uniform(0, interval))          # spread devices over one send interval
+        next_send = time.time()
+        while not stop.is_set():
+            bpm = min(150.0, max(45.0, bpm + random.gauss(0, 2)))
+            hrv = min(90.0, max(10.0, hrv + random.gauss(0, 1.5)))
+            try:
+                device.emit("vitals_update", {"bpm": round(bpm), "hrv": round(hrv), "client_ts": time.time()},
+                            namespace="/hardware")
+                with lock:
+                    stats["sent"] += 1
+            except socketio.exceptions.SocketIOError:
+                with lock:
+                    stats["send_errors"] += 1
+            next_send += interval
+            stop.wait(max(0.0, next_send - time.time()))
+
+    try:
+        for index in range(devices):
+            device_auth.append(pair_device(url, cookie, f"sim-{index}"))
+        threads = [threading.Thread(target=device_loop, args=(i,), daemon=True) for i in range(devices)]
+        started = time.time()
+        for t in threads:
+            t.start()
+        stop.wait(duration)
+        stop.set()
+        for t in threads:
+            t.join(2.0)
+        time.sleep(0.5)                                 # let in-flight updates arrive
+        elapsed = time.time() - started
+    finally:
+        stop.set()
+        if monitor:
+            monitor.stop()
+        for client in clients:
+            try:
+                client.disconnect()
+            except Exception:
+                pass
+        # the simulated devices must not stay paired to the real account
+        for auth in device_auth:
+            unpair_device(url, cookie, auth["device_id"])
+
+    return {
+        "url": url,
+        "config": {"devices": devices, "rate_hz": rate, "duration": duration, "watchers": watchers,
+                   "web_clients": web_clients},
+        "elapsed_seconds": round(elapsed, 2),
+        "sent": stats["sent"],
+        "received": stats["received"],
+        "send_rate": round(stats["sent"] / elapsed, 1) if elapsed else 0.0,
+        "receive_rate": round(stats["received"] / elapsed, 1) if elapsed else 0.0,
+        "connect_errors": stats["connect_errors"],
+        "send_errors": stats["send_errors"],
+        "latency": summarize(latencies),
+        "server": monitor.report() if monitor else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate ESP32 vitals clients against the /hardware namespace.")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--email", required=True, help="account the simulated devices belong to")
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--devices", type=int, default=10)
+    parser.add_argument("--rate", type=float, default=5.0, help="vitals_update messages per second per device")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to send for")
+    parser.add_argument("--watchers", type=int, default=1, help="logged-in clients receiving vitals_from_server")
+    parser.add_argument("--web-clients", type=int, default=0, help="idle clients on the default namespace")
+    parser.add_argument("--server-pid", type=int, default=None)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = run_load_test(
+        args.url.rstrip("/"), args.email, args.password,
+        devices=max(1, args.devices), rate=max(0.1, args.rate), duration=args.duration,
+        watchers=max(1, args.watchers), web_clients=max(0, args.web_clients), server_pid=args.server_pid,
+    )
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+        print(f"Load test report written to {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,17 +10,21 @@ import threading
 import platform
 import webbrowser
 import sys  # ADDED for command-line arguments
-from collections import Counter
 import requests
 import json
 
 import customtkinter as ctk
  
-from PIL import Image, ImageTk
+from PIL import Image
 from customtkinter import CTkImage
 
 
-from deepface import DeepFace
+from camera_capture import CameraCapture
+from preview_renderer import PreviewRenderer
+from spotify_recommender import PlaylistRefresher, RecommendationCache, recommend_playlist
+from spotify_clients import SpotifyClientPool
+from playback_watcher import next_poll_delay
+from emotion_engine import AdaptiveAnalysisScheduler, EmotionEngine, EmotionInferencePool, DetectorBackendManager, FaceDetector, analyze_faces_batch, load_emotion_model
 BASE_API_URL = "http://127.0.0.1:5000"
 import pygame
 import speech_recognition as sr
@@ -46,17 +50,29 @@ load_dotenv()  # loads environment variables from .env
 
 MONGO_URI = os.getenv("MONGO_URI")
 history_col = None
+recommendation_cache_col = None
 try:
     if MONGO_URI:
         client = MongoClient(MONGO_URI)
         db = client["emotion_music_app"]
         history_col = db["music_history"]
+        recommendation_cache_col = db["recommendation_cache"]  # shared with the web app
         print("MongoDB: connected.")
     else:
         print("MongoDB: MONGO_URI not set — DB history disabled.")
 except Exception as e:
     print(f"MongoDB init error: {e}")
     history_col = None
+    recommendation_cache_col = None
+
+# Playlist picks per (language, emotion), shared with the web app through Mongo when available
+recommendation_cache = RecommendationCache(
+    ttl=int(os.getenv("RECOMMENDATION_CACHE_TTL", "3600")),
+    collection=recommendation_cache_col,
+)
+
+# Spotify calls reuse keep-alive connections instead of opening one per client
+spotify_clients = SpotifyClientPool(api_base=os.getenv("SPOTIFY_API_BASE") or None)
 
 # ---------------------------
 # Configuration
@@ -65,17 +81,49 @@ CONFIG = {
     "music_mode": "Local",  # "Local" or "Spotify"
     "current_language": "english", # This will be overwritten by user's default
     "supported_languages": ["english", "malayalam", "hindi", "tamil"],
+    "spotify_lookup_deadline": 6.0,        # seconds for the playlist search + detail lookups
+    "spotify_precompute_interval": 3600,   # re-rank every language x emotion pair (only without the shared cache)
+    "spotify_poll_max_interval": 20.0,     # longest wait between playback polls mid-track
+    "spotify_poll_min_interval": 1.0,      # shortest wait, around track changes
+    "spotify_poll_idle_interval": 3.0,     # wait while paused or nothing is playing
+    "spotify_poll_max_backoff": 60.0,      # longest wait after repeated poll errors
 
     "analysis_interval_seconds": 0.5,      # how often to run analysis (time-based)
     "detection_duration": 20,              # how long to collect detections (seconds)
     "confidence_threshold": 0.4,           # probability threshold (0.0-1.0)
     "emotions": ["angry", "happy", "neutral", "sad"],
+    "lock_in_share": 0.4,                  # share of detections the top emotion needs to lock in
+    "sad_lock_in_share": 0.25,             # 'sad' is locked in more readily (sensitive rule)
+    "aggregation_half_life_seconds": 8.0,  # older detections fade out with this half-life
+
+    "adaptive_analysis": True,             # size the interval from inference latency and end early
+    "analysis_interval_min": 0.1,
+    "analysis_interval_max": 2.0,
+    "early_lock_min_detections": 6,        # never lock in early on fewer detections than this
+    "early_lock_min_seconds": 2.0,
+    "early_lock_z": 1.96,                  # confidence (z-score) of the early lock-in test
 
     "face_detection_scale_factor": 1.1,
     "face_detection_min_neighbors": 5,
     "face_detection_min_size": (130, 130),
-    "detection_window_max_hits": 40,       # cap for stored detections
+    "face_detection_mode": "tracking",     # "tracking" (downscaled cascade + tracking) or "full"
+    "face_detection_downscale": 0.5,       # cascade runs on the frame resized by this factor
+    "face_redetect_interval": 5,           # run the cascade every N frames, track in between
+    "face_track_min_score": 0.6,           # weaker template matches force a re-detect
     "camera_probe_count": 4,               # how many camera indices to cycle through
+    "camera_buffer_size": 4,               # preallocated frames in the capture ring buffer
+    "preview_size": (640, 480),            # webcam preview is downsized to this before conversion
+    "preview_max_fps": 30,                 # preview refresh cap, independent of the update() loop
+
+    "detector_backends": ["mtcnn", "opencv"],  # DeepFace detectors; fastest working one is used
+    "detector_failure_threshold": 3,       # consecutive failures before a backend is skipped
+    "detector_cooldown_seconds": 60,       # how long a failing backend is skipped
+
+    "inference_workers": 1,                # fixed number of emotion inference threads
+    "inference_queue_size": 16,            # frames waiting for a worker; oldest dropped when full
+    "inference_batch_size": 8,             # max face crops per model call
+    "inference_batch_timeout": 0.25,       # seconds to wait for a batch to fill
+    "max_frame_age_seconds": 1.5,          # workers skip frames older than this
 
     "spotify_premium": False,
 }
@@ -113,10 +161,10 @@ class EmotionMusicPlayerApp:
         self.frame_counter = 0
         self.detection_start_time = None
         self._last_analysis_ts = 0.0
-        self.emotion_detections = []
         self.last_detected_emotion_for_display = ""
         self.analysis_result_queue = queue.Queue()
         self.sp = None
+        self.playlist_refresher = None
         self.volume = None
         self.current_playlist_url = None
         self.is_paused = False
@@ -130,6 +178,7 @@ class EmotionMusicPlayerApp:
         self.is_spotify_premium = False
         self.spotify_device_id = None
         self.spotify_monitor_thread = None
+        self.spotify_monitor_wakeup = threading.Event()  # cuts a monitor wait short (skips, stop)
         self.is_spotify_playing = False
         self.last_logged_track_uri = None
        
@@ -162,6 +211,7 @@ class EmotionMusicPlayerApp:
 
 
         self.webcam_label = ctk.CTkLabel(self.webcam_frame, text="")
+        self.preview = PreviewRenderer(self.webcam_label, size=CONFIG["preview_size"], max_fps=CONFIG["preview_max_fps"])
         self.placeholder_label = ctk.CTkLabel(
             self.webcam_frame,
             text="Select a mode to begin.",
@@ -330,10 +380,61 @@ class EmotionMusicPlayerApp:
 
 
         # Setup
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        self.face_detector = FaceDetector(
+            scale_factor=CONFIG["face_detection_scale_factor"],
+            min_neighbors=CONFIG["face_detection_min_neighbors"],
+            min_size=CONFIG["face_detection_min_size"],
+            mode=CONFIG["face_detection_mode"],
+            downscale=CONFIG["face_detection_downscale"],
+            redetect_interval=CONFIG["face_redetect_interval"],
+            track_min_score=CONFIG["face_track_min_score"]
+        )
+        self.latest_detection = None
+        self.capture = None
         self.initialize_system_components()
         self.initialize_camera()
 
+        # Warm emotion model + bounded inference workers
+        self.backend_manager = DetectorBackendManager(
+            CONFIG["detector_backends"],
+            failure_threshold=CONFIG["detector_failure_threshold"],
+            cooldown=CONFIG["detector_cooldown_seconds"]
+        )
+        self.inference_pool = EmotionInferencePool(
+            self.extract_face_crop,
+            self.run_emotion_analysis,
+            self.analysis_result_queue,
+            num_workers=CONFIG["inference_workers"],
+            max_pending=CONFIG["inference_queue_size"],
+            max_frame_age=CONFIG["max_frame_age_seconds"],
+            batch_size=CONFIG["inference_batch_size"],
+            batch_timeout=CONFIG["inference_batch_timeout"],
+            warm_up_fn=lambda: load_emotion_model(self.backend_manager)
+        )
+        self.inference_pool.start()
+        analysis_scheduler = AdaptiveAnalysisScheduler(
+            base_interval=CONFIG["analysis_interval_seconds"],
+            min_interval=CONFIG["analysis_interval_min"],
+            max_interval=CONFIG["analysis_interval_max"],
+            workers=CONFIG["inference_workers"],
+            min_detections=CONFIG["early_lock_min_detections"],
+            min_seconds=CONFIG["early_lock_min_seconds"],
+            z=CONFIG["early_lock_z"]
+        )
+        # Detection window + lock-in decisions (shared with the headless service)
+        self.engine = EmotionEngine(
+            detector=self.face_detector,
+            scheduler=analysis_scheduler,
+            detection_duration=CONFIG["detection_duration"],
+            half_life=CONFIG["aggregation_half_life_seconds"],
+            lock_in_share=CONFIG["lock_in_share"],
+            sad_lock_in_share=CONFIG["sad_lock_in_share"],
+            early_lock=CONFIG["adaptive_analysis"],
+            backend_manager=self.backend_manager,
+            emotions=CONFIG["emotions"],
+            confidence_threshold=CONFIG["confidence_threshold"]
+        )
+
         # Start voice thread
         self.voice_thread = threading.Thread(target=self.listen_for_voice_commands, daemon=True)
         self.voice_thread.start()
@@ -405,8 +506,10 @@ class EmotionMusicPlayerApp:
             # Start monitoring thread
             if self.spotify_monitor_thread and self.spotify_monitor_thread.is_alive():
                  self.is_running_monitor = False # Signal old thread to stop
-                 time.sleep(0.5)
+                 self.spotify_monitor_wakeup.set()
+                 self.spotify_monitor_thread.join(timeout=2.0)
 
+            self.spotify_monitor_wakeup.clear()
             self.is_running_monitor = True
             self.spotify_monitor_thread = threading.Thread(target=self._spotify_playback_monitor, args=(playlist_id,), daemon=True)
             self.spotify_monitor_thread.start()
@@ -439,12 +542,18 @@ class EmotionMusicPlayerApp:
             self.spotify_device_id = None
 
     def _spotify_playback_monitor(self, playlist_id):
-        """Periodically checks Spotify's state to update UI, log history, and re-trigger detection when playback ends."""
+        """Checks Spotify's state to update UI, log history, and re-trigger detection when playback ends.
+
+        The next check is scheduled from the time left in the current track: rare mid-track,
+        just after the track should end. Errors back off instead of stopping the monitor.
+        """
         was_playing = True
+        failures = 0
 
         while self.is_running_monitor and self.is_running:
             try:
                 playback = self.sp.current_playback()
+                failures = 0
                 if playback and playback['is_playing'] and playback['item']:
                     was_playing = True # Mark that music is currently playing
                     self.is_spotify_playing = True
@@ -476,11 +585,23 @@ class EmotionMusicPlayerApp:
 
                     self.root.after(0, lambda: self.play_pause_button.configure(image=self.play_icon))
 
-                time.sleep(3) # Check every 3 seconds
+                delay = next_poll_delay(
+                    playback,
+                    min_delay=CONFIG["spotify_poll_min_interval"],
+                    max_delay=CONFIG["spotify_poll_max_interval"],
+                    idle_delay=CONFIG["spotify_poll_idle_interval"],
+                )
             except Exception as e:
-                print(f"Playback monitor error: {e}")
-                self.is_running_monitor = False
-                break
+                failures += 1
+                delay = min(CONFIG["spotify_poll_max_backoff"], CONFIG["spotify_poll_idle_interval"] * 2 ** failures)
+                print(f"Playback monitor error: {e} (retrying in {delay:.0f}s)")
+
+            if self.spotify_monitor_wakeup.wait(delay):
+                self.spotify_monitor_wakeup.clear()
+
+    def _wake_spotify_monitor(self, delay=0.5):
+        """Re-check playback shortly, e.g. after a skip, instead of at the scheduled time."""
+        threading.Timer(delay, self.spotify_monitor_wakeup.set).start()
 
     def get_last_song_index(self, language, emotion):
         """Return last stored index for language+emotion, default 0."""
@@ -638,6 +759,7 @@ class EmotionMusicPlayerApp:
     # ---------------------------
     def initialize_camera(self):
         """Tries multiple backends to open camera robustly."""
+        self.stop_capture()
         if hasattr(self, 'cap') and self.cap and self.cap.isOpened():
             try:
                 self.cap.release()
@@ -663,10 +785,21 @@ class EmotionMusicPlayerApp:
             self.placeholder_label.configure(text=f"Error: Camera {self.camera_index} not found.")
         else:
             print(f"Camera opened at index {self.camera_index}")
+            self.capture = CameraCapture(self.cap, buffer_size=CONFIG["camera_buffer_size"])
+            self.capture.start()
+
+    def stop_capture(self):
+        """Stop the capture thread (must happen before the camera is released)."""
+        if self.capture:
+            stats = self.capture.get_stats()
+            print(f"Camera capture stats: {stats['captured']} frames, {stats['dropped']} dropped, {stats['fps']} fps")
+            self.capture.stop()
+            self.capture = None
 
     def switch_camera(self):
         """Cycle to next camera index modulo probe count."""
         self.camera_index = (self.camera_index + 1) % CONFIG["camera_probe_count"]
+        self.stop_capture()
         if hasattr(self, 'cap') and getattr(self, 'cap', None):
             try:
                 if self.cap.isOpened():
@@ -674,78 +807,29 @@ class EmotionMusicPlayerApp:
             except Exception:
                 pass
         self.initialize_camera()
+        self.face_detector.reset_tracking()
         if self.app_state != AppState.CAMERA_ERROR:
             self.start_detection()
 
-    def display_frame(self, frame):
+    def display_frame(self, detection):
         """Display frame with overlay of detected emotion label."""
-        try:
-            gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        except Exception:
-            return
-        faces = self.face_cascade.detectMultiScale(
-            gray_frame,
-            scaleFactor=CONFIG["face_detection_scale_factor"],
-            minNeighbors=CONFIG["face_detection_min_neighbors"],
-            minSize=CONFIG["face_detection_min_size"]
+        self.preview.render(
+            detection.frame,
+            box=detection.largest_face(),
+            label_text=self.last_detected_emotion_for_display.capitalize()
         )
-        if len(faces) > 0:
-            (x, y, w, h) = faces[0]
-            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-            if self.last_detected_emotion_for_display:
-                cv2.putText(frame, self.last_detected_emotion_for_display.capitalize(), (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
-        cv2image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA)
-        img = Image.fromarray(cv2image)
-        imgtk = ImageTk.PhotoImage(image=img)
-        self.webcam_label.imgtk = imgtk
-        self.webcam_label.configure(image=imgtk)
 
     # ---------------------------
     # Emotion detection helpers
     # ---------------------------
-    def _largest_face_roi(self, frame_gray):
-        faces = self.face_cascade.detectMultiScale(
-            frame_gray,
-            scaleFactor=CONFIG["face_detection_scale_factor"],
-            minNeighbors=CONFIG["face_detection_min_neighbors"],
-            minSize=CONFIG["face_detection_min_size"]
-        )
-        if len(faces) == 0:
-            return None
-        return max(faces, key=lambda f: f[2] * f[3])
+    def extract_face_crop(self, detection):
+        """Crop the largest face using the boxes already found for that frame."""
+        return detection.face_crop()
 
-    def run_emotion_analysis(self, frame):
-        """Analyze (in separate thread)."""
-        try:
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            roi = self._largest_face_roi(gray)
-            if roi is not None:
-                x, y, w, h = roi
-                face_frame = frame[y:y+h, x:x+w]
-            else:
-                face_frame = frame
-            try:
-                analysis = DeepFace.analyze(face_frame, actions=['emotion'], enforce_detection=False, detector_backend='mtcnn')
-            except Exception:
-                analysis = DeepFace.analyze(face_frame, actions=['emotion'], enforce_detection=False)
-            if isinstance(analysis, list) and len(analysis) > 0:
-                analysis = analysis[0]
-            emotions_dict = analysis.get('emotion') or {}
-            if emotions_dict:
-                label, prob = max(emotions_dict.items(), key=lambda kv: kv[1])
-                if label in CONFIG["emotions"] and prob >= (CONFIG["confidence_threshold"] * 100.0):
-                    self.analysis_result_queue.put(label)
-                    return
-                dom = analysis.get('dominant_emotion')
-                if dom in CONFIG["emotions"]:
-                    self.analysis_result_queue.put(dom)
-                    return
-            else:
-                dom = analysis.get('dominant_emotion')
-                if dom in CONFIG["emotions"]:
-                    self.analysis_result_queue.put(dom)
-        except Exception as e:
-            print(f"Emotion analysis error: {e}")
+    def run_emotion_analysis(self, face_frames):
+        """Analyze a micro-batch of face crops in one model call (inference pool worker)."""
+        return analyze_faces_batch(face_frames, self.backend_manager,
+                                   CONFIG["emotions"], CONFIG["confidence_threshold"])
 
     def process_analysis_queue(self):
         """Move items from worker queue to app state."""
@@ -753,35 +837,27 @@ class EmotionMusicPlayerApp:
          return
         try:
             while not self.analysis_result_queue.empty():
-                detected_emotion = self.analysis_result_queue.get_nowait()
-                self.emotion_detections.append(detected_emotion)
-                if len(self.emotion_detections) > CONFIG["detection_window_max_hits"]:
-                    self.emotion_detections = self.emotion_detections[-CONFIG["detection_window_max_hits"]:]
-                self.last_detected_emotion_for_display = detected_emotion
-                self.root.after(0, lambda e=detected_emotion: self.emotion_label.configure(text=f"Detected: {e.capitalize()}"))
+                result = self.analysis_result_queue.get_nowait()
+                # The engine ignores results from frames captured before the current detection window
+                events = self.engine.add_result(result)
+                if not events:
+                    continue
+                event = events[0]
+                self.last_detected_emotion_for_display = event["emotion"]
+                text = f"Detected: {event['emotion'].capitalize()} (leaning {event['leader']} {event['confidence']:.0%})"
+                self.root.after(0, lambda t=text: self.emotion_label.configure(text=t))
         except queue.Empty:
             pass
 
-    def get_confident_emotion(self):
-        """Return most frequent detection, with special sensitivity for 'sad'."""
-        if not self.emotion_detections:
-            return "neutral"
-
-        emotion_counts = Counter(self.emotion_detections)
-        most_common, count = emotion_counts.most_common(1)[0]
-
-        total_detections = len(self.emotion_detections)
-        confidence_percentage = count / total_detections
-
-        if most_common == 'sad' and confidence_percentage >= 0.25:
-            print(f"Confident emotion found (sensitive rule): {most_common} ({confidence_percentage:.0%})")
-            return most_common
-        elif confidence_percentage >= 0.4:
-            print(f"Confident emotion found (standard rule): {most_common} ({confidence_percentage:.0%})")
-            return most_common
-        else:
-            print(f"No confident emotion found (Top was {most_common} at {confidence_percentage:.0%}). Defaulting to neutral.")
-            return "neutral"
+    def log_pipeline_stats(self):
+        """Print capture, preview and inference counters for the last detection run."""
+        if self.capture:
+            cap_stats = self.capture.get_stats()
+            print(f"Capture: {cap_stats['fps']} fps, {cap_stats['dropped']} frames dropped")
+        prev_stats = self.preview.get_stats()
+        print(f"Preview: {prev_stats['frames']} frames, avg render {prev_stats['avg_render_ms']} ms")
+        print(f"Inference: {self.inference_pool.get_stats()}")
+        print(f"Detector backends: {self.backend_manager.get_stats()}")
 
     # ---------------------------
     # Detection lifecycle
@@ -813,8 +889,10 @@ class EmotionMusicPlayerApp:
             except Exception:
                 pass
         self.detection_start_time = None
-        self.emotion_detections.clear()
+        self.engine.reset()
         self._last_analysis_ts = 0.0
+        self.inference_pool.flush()
+        self.face_detector.reset_tracking()
         self.app_state = AppState.DETECTING
         self.song_label.configure(text="None")
         self.emotion_label.configure(text="Detected: Detecting...")
@@ -829,23 +907,34 @@ class EmotionMusicPlayerApp:
         if self.detection_start_time is None:
             self.detection_start_time = time.time()
             self._last_analysis_ts = 0.0
+            self.engine.reset(self.detection_start_time)
         time_elapsed = time.time() - self.detection_start_time
         time_left = max(0, CONFIG["detection_duration"] - time_elapsed)
         self.timer_label.configure(text=f"Detecting for: {int(time_left)}s")
         # Update the progress bar
         progress = time_elapsed / CONFIG["detection_duration"]
         self.progress_bar.set(progress)
-        if time.time() - getattr(self, "_last_analysis_ts", 0.0) >= CONFIG["analysis_interval_seconds"]:
-            ret, frame = self.cap.read()
-            if ret:
-                threading.Thread(target=self.run_emotion_analysis, args=(frame.copy(),), daemon=True).start()
-                self._last_analysis_ts = time.time()
-        if time_elapsed >= CONFIG["detection_duration"]:
-            chosen = self.get_confident_emotion()
-            if not self.emotion_detections:
-                chosen = "neutral"
+        if CONFIG["adaptive_analysis"]:
+            interval = self.engine.scheduler.interval(self.inference_pool.frame_latency)
+        else:
+            interval = CONFIG["analysis_interval_seconds"]
+        if time.time() - getattr(self, "_last_analysis_ts", 0.0) >= interval:
+            detection = self.latest_detection
+            if detection is not None and detection.timestamp > self._last_analysis_ts:
+                # the frame lives in the capture ring buffer: copy it unless the camera has reused
+                # the slot since detect() (a stalled Tk loop), or the boxes would crop a later frame
+                frame = self.capture.copy_frame(detection.seq, detection.frame) if self.capture else None
+                if frame is not None:
+                    self.inference_pool.submit(detection.detached(frame), detection.timestamp)
+                    self._last_analysis_ts = detection.timestamp
+        decision = self.engine.check()
+        if decision:
+            if decision["reason"] == "early":
+                print(f"Early lock-in after {decision['elapsed']:.1f}s on {decision['detections']} detections: "
+                      f"{decision['emotion']} ({decision['confidence']:.0%})")
+            elif decision["reason"] == "no_face":
                 self.emotion_label.configure(text="Detected: No face - defaulting to Neutral")
-            self.lock_in_emotion(chosen)
+            self.lock_in_emotion(decision["emotion"])
 
     def lock_in_emotion(self, emotion):
 
@@ -859,6 +948,7 @@ class EmotionMusicPlayerApp:
             return
         self.progress_bar.set(0)  # Reset the bar
         self.progress_bar.pack_forget()  # Hide the bar again
+        self.log_pipeline_stats()
 
         self.target_emotion_for_playback = emotion
         print(f"Emotion locked in: {emotion}. Finding matching music.")
@@ -875,6 +965,7 @@ class EmotionMusicPlayerApp:
             # reset detection timer so next detection starts fresh after resume
             self.detection_start_time = None
             # optional: clear any queued analysis results to avoid backlog
+            self.inference_pool.flush()
             try:
                 while not self.analysis_result_queue.empty():
                     self.analysis_result_queue.get_nowait()
@@ -909,10 +1000,11 @@ class EmotionMusicPlayerApp:
         """Authenticate Spotify using ONLY the token provided from app.py."""
         try:
             if self.spotify_access_token and self.is_spotify_token_valid():
-                self.sp = spotipy.Spotify(auth=self.spotify_access_token)
+                self.sp = spotify_clients.get(self.user_email, self.spotify_access_token)
                 self.sp.current_user()  # This API call is now safe to make.
                 
                 print("Spotify authenticated using token from web session.")
+                self.start_playlist_refresher()
                 self.app_state = AppState.IDLE
                 self.placeholder_label.configure(text="Spotify connected successfully!")
             else:
@@ -928,6 +1020,21 @@ class EmotionMusicPlayerApp:
             self.sp = None
 
 
+    def start_playlist_refresher(self):
+        """Precompute playlist rankings locally when the web server's shared cache is unavailable."""
+        if recommendation_cache_col is not None or self.playlist_refresher or not CONFIG["spotify_precompute_interval"]:
+            return
+        self.playlist_refresher = PlaylistRefresher(
+            lambda: self.sp,
+            recommendation_cache,
+            languages=CONFIG["supported_languages"],
+            emotions=CONFIG["emotions"],
+            interval=CONFIG["spotify_precompute_interval"],
+            deadline=CONFIG["spotify_lookup_deadline"] * 2,
+        )
+        recommendation_cache.ttl = max(recommendation_cache.ttl, 2 * CONFIG["spotify_precompute_interval"])
+        self.playlist_refresher.start()
+
     def suggest_spotify_playlist(self):
         """
         Finds the most popular playlist matching language and emotion, with a fallback.
@@ -941,61 +1048,16 @@ class EmotionMusicPlayerApp:
         self.root.update_idletasks() # Force the UI to update immediately
         self.timer_label.configure(text="")
         
-        LANGUAGE_SYNONYMS = {
-            "english": ["english", "hollywood"],
-            "hindi": ["hindi", "bollywood"],
-            "malayalam": ["malayalam", "mollywood"],
-            "tamil": ["tamil", "kollywood"],
-        }
-        EMOTION_SYNONYMS = {
-            "happy": ["happy", "joy", "positive", "vibe", "energetic"],
-            "sad": ["sad", "melancholy", "blue", "poignant"],
-            "angry": ["angry", "rage", "furious", "aggressive"],
-            "neutral": ["neutral", "calm", "chill", "serene"],
-        }
-
         lang = CONFIG["current_language"].lower()
         emo = self.target_emotion_for_playback.lower()
-        lang_keywords = LANGUAGE_SYNONYMS.get(lang, [lang])
-        emo_keywords = EMOTION_SYNONYMS.get(emo, [emo])
 
         try:
-            query_templates = [ f"{lang} {emo}", f"{emo} {lang}", f"{lang} {emo} playlist", f"{emo} vibes" ]
-            seen_ids = set()
-            print(f"🔎 Dynamically searching Spotify for a {lang} {emo} playlist...")
-            for q in query_templates:
-                results = self.sp.search(q=q, type="playlist", limit=15)
-                items = results.get('playlists', {}).get('items', []) or []
-                for p in items:
-                    if p and p.get('id'):
-                        seen_ids.add(p['id'])
-            
-            valid_candidates = []
-            if seen_ids:
-                print(f"Found {len(seen_ids)} potential playlists. Fetching details...")
-                for pid in list(seen_ids):
-                    try:
-                        playlist_details = self.sp.playlist(pid, fields="name,description,followers,external_urls,id,uri")
-                        text_to_check = (playlist_details.get('name', '') + " " + playlist_details.get('description', '')).lower()
-                        if any(k in text_to_check for k in lang_keywords) and any(k in text_to_check for k in emo_keywords):
-                            valid_candidates.append(playlist_details)
-                    except Exception:
-                        pass
-            
-            chosen_playlist = None
-            if valid_candidates:
-                print(f"Found {len(valid_candidates)} relevant playlists. Selecting the most popular.")
-                chosen_playlist = max(valid_candidates, key=lambda p: p.get('followers', {}).get('total', 0))
-            
-            # --- NEW: Fallback search if the primary search finds no valid candidates ---
-            if not chosen_playlist:
-                print("Primary search failed. Trying fallback search...")
-                results = self.sp.search(q=f"{emo} playlist", type="playlist", limit=1)
-                items = results.get('playlists', {}).get('items', []) or []
-                if items:
-                    pid = items[0]['id']
-                    chosen_playlist = self.sp.playlist(pid, fields="name,description,followers,external_urls,id,uri")
-            # --- END OF FALLBACK ---
+            lookup_report = {}
+            chosen_playlist = recommend_playlist(self.sp, lang, emo, recommendation_cache,
+                                                 deadline=CONFIG["spotify_lookup_deadline"], report=lookup_report)
+            if lookup_report:
+                print(f"Spotify lookups: {lookup_report['lookups_completed']}/{lookup_report['lookups']} "
+                      f"details in {lookup_report['elapsed']}s")
 
             if chosen_playlist:
                 playlist_name = chosen_playlist.get("name", "Playlist")
@@ -1096,7 +1158,9 @@ class EmotionMusicPlayerApp:
     def play_next_song(self):
         """Manual next button handler for both Local and Spotify."""
         if CONFIG["music_mode"] == "Spotify" and self.is_spotify_premium:
-            if self.sp and self.spotify_device_id: self.sp.next_track(device_id=self.spotify_device_id)
+            if self.sp and self.spotify_device_id:
+                self.sp.next_track(device_id=self.spotify_device_id)
+                self._wake_spotify_monitor()
         elif CONFIG["music_mode"] == "Local" and self.app_state == AppState.PLAYING:
             self.is_manually_skipping = True
             self.play_next_song_from_queue()
@@ -1104,7 +1168,9 @@ class EmotionMusicPlayerApp:
     def play_previous_song(self):
         """Manual previous button handler for both Local and Spotify."""
         if CONFIG["music_mode"] == "Spotify" and self.is_spotify_premium:
-            if self.sp and self.spotify_device_id: self.sp.previous_track(device_id=self.spotify_device_id)
+            if self.sp and self.spotify_device_id:
+                self.sp.previous_track(device_id=self.spotify_device_id)
+                self._wake_spotify_monitor()
         elif CONFIG["music_mode"] == "Local" and self.app_state == AppState.PLAYING:
             self.is_manually_skipping = True
             try:
@@ -1140,6 +1206,7 @@ class EmotionMusicPlayerApp:
                         self.sp.start_playback(device_id=self.spotify_device_id)
                         self.is_spotify_playing = True
                         self.play_pause_button.configure(image=self.pause_icon, text="Pause")
+                    self._wake_spotify_monitor()
                 except Exception as e:
                     print(f"Spotify toggle pause/play error: {e}")
 
@@ -1393,6 +1460,7 @@ class EmotionMusicPlayerApp:
         """Switch between Local and Spotify modes."""
         if CONFIG["music_mode"] == "Spotify":
             self.is_running_monitor = False
+            self.spotify_monitor_wakeup.set()
             if self.sp and self.spotify_device_id:
                 try:
                     self.sp.pause_playback(device_id=self.spotify_device_id)
@@ -1505,14 +1573,20 @@ class EmotionMusicPlayerApp:
         self.root.after(20, self.update)
 
     def update_webcam_feed(self):
-        if not hasattr(self, 'cap') or not getattr(self, 'cap', None) or not self.cap.isOpened():
+        if not self.capture:
             return
-        ret, frame = self.cap.read()
-        if not ret:
+        if self.capture.failed:
             self.app_state = AppState.CAMERA_ERROR
             self.placeholder_label.configure(text="Error: Failed to get frame.")
             return
-        self.display_frame(frame)
+        if not self.preview.due():
+            return  # preview fps cap
+        seq, frame_ts, frame = self.capture.latest()
+        if frame is None or seq == self.frame_counter:
+            return  # no new frame since the last tick
+        self.frame_counter = seq
+        self.latest_detection = self.face_detector.detect(frame, seq, frame_ts)
+        self.display_frame(self.latest_detection)
 
     def on_closing(self):
         try:
@@ -1527,7 +1601,12 @@ class EmotionMusicPlayerApp:
             print(f"Could not release player lock: {e}")
 
         self.is_running_monitor = False
+        self.spotify_monitor_wakeup.set()
         self.is_running = False
+        if self.playlist_refresher:
+            self.playlist_refresher.stop()
+        self.inference_pool.stop()
+        self.stop_capture()
         time.sleep(0.2)
         try:
             if hasattr(self, 'cap') and self.cap.isOpened():
@@ -0,0 +1,209 @@
+# playback_watcher.py
+"""
+Server-side "now playing" watcher for the vitals player.
+
+Instead of every open tab polling ``/spotify/current-playback``, each user
+with at least one subscribed socket gets a single poll every ``interval``
+seconds (``idle_interval`` while nothing plays). Only changes (track,
+play/pause, playlist context or device) are pushed to the user's room, and
+track changes inside a playlist are saved for the resume feature from here,
+so tabs no longer post ``/log_spotify_state``. Listening history is logged
+from here too, once per track change however many tabs are open.
+"""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def next_poll_delay(playback, min_delay=1.0, max_delay=15.0, end_margin=1.0, idle_delay=None):
+    """Seconds until the next current_playback() poll.
+
+    While a track plays the next poll lands ``end_margin`` seconds after it
+    should end (at most ``max_delay`` away), so mid-track polls are rare and
+    the song change is seen promptly. Paused or empty playback waits
+    ``idle_delay`` (default ``max_delay``).
+    """
+    item = (playback or {}).get("item")
+    if not item or not playback.get("is_playing"):
+        return max_delay if idle_delay is None else idle_delay
+    duration_ms = item.get("duration_ms")
+    if not duration_ms:
+        return max_delay
+    remaining = (duration_ms - (playback.get("progress_ms") or 0)) / 1000.0
+    return max(min_delay, min(max_delay, remaining + end_margin))
+
+
+def slim_playback(playback):
+    """The parts of a current_playback() response the player uses, or None when nothing is loaded."""
+    if not playback or not playback.get("item"):
+        return None
+    item = playback["item"]
+    context = playback.get("context") or {}
+    device = playback.get("device") or {}
+    return {
+        "is_playing": bool(playback.get("is_playing")),
+        "progress_ms": playback.get("progress_ms") or 0,
+        "item": {
+            "id": item.get("id"),
+            "uri": item.get("uri"),
+            "name": item.get("name"),
+            "duration_ms": item.get("duration_ms"),
+            "artists": [{"name": a.get("name")} for a in item.get("artists") or []],
+        },
+        "context": {"uri": context["uri"]} if context.get("uri") else None,
+        "device": {"id": device.get("id"), "name": device.get("name")} if device else None,
+    }
+
+
+def _signature(state):
+    if state is None:
+        return None
+    return (state["item"]["id"], state["is_playing"], (state["context"] or {}).get("uri"),
+            (state["device"] or {}).get("id"))
+
+
+class _Watch:
+    __slots__ = ("sids", "state", "signature", "next_poll", "in_flight", "failures", "last_track")
+
+    def __init__(self):
+        self.sids = set()
+        self.state = None
+        self.signature = None
+        self.next_poll = 0.0
+        self.in_flight = False
+        self.failures = 0
+        self.last_track = None                 # uri of the last track handled, kept across empty polls
+
+
+class PlaybackWatcher:
+    """Polls Spotify once per watched user and pushes playback changes.
+
+    ``fetch_fn(user)`` returns the raw current_playback() response (None when
+    nothing plays or Spotify is not linked), ``emit_fn(user, state)`` pushes a
+    slimmed state to the user's sockets and ``save_fn(user, playlist_id,
+    track_uri, progress_ms)`` records the track a playlist is on. The optional
+    ``track_fn(user, state)`` is called once for every new track.
+    """
+
+    def __init__(self, fetch_fn, emit_fn, save_fn, interval=3.0, idle_interval=15.0, max_backoff=60.0,
+                 workers=4, tick=0.25, log=print, track_fn=None):
+        self.fetch_fn = fetch_fn
+        self.emit_fn = emit_fn
+        self.save_fn = save_fn
+        self.track_fn = track_fn
+        self.interval = interval
+        self.idle_interval = idle_interval
+        self.max_backoff = max_backoff
+        self.tick = tick
+        self.log = log
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="playback-watch")
+        self._watches = {}
+        self._sid_users = {}
+        self._lock = threading.Lock()
+        self._running = False
+        self.stats = {"polls": 0, "changes": 0, "saves": 0, "errors": 0}
+
+    def subscribe(self, sid, user):
+        """Start watching ``user`` for ``sid``; returns the last known state to send to that socket."""
+        with self._lock:
+            watch = self._watches.get(user)
+            if watch is None:
+                watch = self._watches[user] = _Watch()
+            watch.sids.add(sid)
+            self._sid_users[sid] = user
+            return watch.state
+
+    def unsubscribe(self, sid):
+        with self._lock:
+            user = self._sid_users.pop(sid, None)
+            watch = self._watches.get(user)
+            if watch is None:
+                return
+            watch.sids.discard(sid)
+            if not watch.sids:
+                del self._watches[user]
+
+    def poke(self, user, delay=0.5):
+        """Poll ``user`` soon, e.g. right after a play/pause/skip request."""
+        with self._lock:
+            watch = self._watches.get(user)
+            if watch is not None:
+                watch.next_poll = min(watch.next_poll, time.time() + delay)
+
+    def poll_due(self):
+        """Start a poll for every watched user whose next poll is due."""
+        now = time.time()
+        with self._lock:
+            due = [user for user, w in self._watches.items() if not w.in_flight and now >= w.next_poll]
+            for user in due:
+                self._watches[user].in_flight = True
+        for user in due:
+            self._executor.submit(self._poll, user)
+
+    def _poll(self, user):
+        try:
+            playback = self.fetch_fn(user)
+            failed = False
+        except Exception as e:
+            self.log(f"Playback poll failed for {user}: {e}")
+            playback, failed = None, True
+        state = slim_playback(playback)
+
+        with self._lock:
+            self.stats["polls"] += 1
+            watch = self._watches.get(user)
+            if watch is None:
+                return                                  # last tab closed meanwhile
+            watch.in_flight = False
+            if failed:
+                self.stats["errors"] += 1
+                watch.failures += 1
+                watch.next_poll = time.time() + min(self.max_backoff, self.interval * 2 ** watch.failures)
+                return
+            watch.failures = 0
+            watch.next_poll = time.time() + next_poll_delay(state, min_delay=min(1.0, self.interval),
+                                                            max_delay=self.interval, idle_delay=self.idle_interval)
+            signature = _signature(state)
+            changed = signature != watch.signature
+            # compared with the last track seen, not the last state: a short gap (device handoff, long
+            # pause) reports no playback, and the same track afterwards is not a new one
+            track_changed = state is not None and state["item"]["uri"] != watch.last_track
+            if track_changed:
+                watch.last_track = state["item"]["uri"]
+            watch.state, watch.signature = state, signature
+            if changed:
+                self.stats["changes"] += 1
+
+        if changed:
+            self.emit_fn(user, state)
+        if track_changed and state["context"] and state["context"]["uri"].startswith("spotify:playlist:"):
+            try:
+                self.save_fn(user, state["context"]["uri"].split(":")[-1], state["item"]["uri"], state["progress_ms"])
+                with self._lock:
+                    self.stats["saves"] += 1
+            except Exception as e:
+                self.log(f"Could not save playback state for {user}: {e}")
+        if track_changed and self.track_fn:
+            try:
+                self.track_fn(user, state)
+            except Exception as e:
+                self.log(f"Track change hook failed for {user}: {e}")
+
+    def run(self, sleep_fn=time.sleep):
+        """Scheduling loop; start it with ``socketio.start_background_task(watcher.run, socketio.sleep)``."""
+        self._running = True
+        while self._running:
+            try:
+                self.poll_due()
+            except Exception as e:
+                self.log(f"Playback watcher error: {e}")
+            sleep_fn(self.tick)
+
+    def stop(self):
+        self._running = False
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update({"users": len(self._watches), "sockets": len(self._sid_users)})
+        return stats
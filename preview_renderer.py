@@ -0,0 +1,72 @@
+# preview_renderer.py
+import time
+
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+
+class PreviewRenderer:
+    """Draws webcam frames into a Tk label without allocating per frame.
+
+    One RGB conversion buffer, one resize buffer, one PIL image and one
+    PhotoImage are created on first use and then reused: each frame is resized
+    to the preview size *before* colour conversion, converted BGR -> RGB (no
+    alpha) into the same buffer, loaded into the same PIL image and pasted
+    into the same PhotoImage. Rendering is capped at ``max_fps`` independently
+    of how often the caller ticks.
+    """
+
+    def __init__(self, label, size=(640, 480), max_fps=30):
+        self.label = label
+        self.size = (int(size[0]), int(size[1]))
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self._rgb = np.empty((self.size[1], self.size[0], 3), dtype=np.uint8)
+        self._resized = np.empty((self.size[1], self.size[0], 3), dtype=np.uint8)
+        self._pil = Image.new("RGB", self.size)
+        self._photo = None
+        self._last_render = 0.0
+        self.frames_rendered = 0
+        self.total_render_ms = 0.0
+        self.last_render_ms = 0.0
+
+    def due(self, now=None):
+        """True when enough time has passed since the last frame to render another one."""
+        now = now if now is not None else time.time()
+        return now - self._last_render >= self.min_interval
+
+    def render(self, frame, box=None, label_text=""):
+        """Render a BGR frame, with an optional (x, y, w, h) box in frame coordinates."""
+        start = time.perf_counter()
+        self._last_render = time.time()
+
+        src_h, src_w = frame.shape[:2]
+        if (src_w, src_h) == self.size:
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._rgb)
+        else:
+            cv2.resize(frame, self.size, dst=self._resized, interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(self._resized, cv2.COLOR_BGR2RGB, dst=self._rgb)
+
+        if box is not None:
+            sx, sy = self.size[0] / src_w, self.size[1] / src_h
+            x, y, w, h = box
+            x, y, w, h = int(x * sx), int(y * sy), int(w * sx), int(h * sy)
+            cv2.rectangle(self._rgb, (x, y), (x + w, y + h), (0, 255, 0), 2)
+            if label_text:
+                cv2.putText(self._rgb, label_text, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
+
+        self._pil.frombytes(self._rgb)
+        if self._photo is None:
+            self._photo = ImageTk.PhotoImage(image=self._pil)
+            self.label.imgtk = self._photo
+            self.label.configure(image=self._photo)
+        else:
+            self._photo.paste(self._pil)
+
+        self.last_render_ms = (time.perf_counter() - start) * 1000.0
+        self.total_render_ms += self.last_render_ms
+        self.frames_rendered += 1
+
+    def get_stats(self):
+        avg = (self.total_render_ms / self.frames_rendered) if self.frames_rendered else 0.0
+        return {"frames": self.frames_rendered, "avg_render_ms": round(avg, 2), "last_render_ms": round(self.last_render_ms, 2)}
@@ -0,0 +1,239 @@
+# simulate_vitals.py
+"""
+Hardware simulator for the vitals path: drives /hardware without an ESP32.
+
+Virtual devices either synthesize BPM/HRV from a scripted scenario (seeded,
+so runs are reproducible) or replay a recorded CSV trace (``t,bpm,hrv`` with
+an optional ``device`` column). A logged-in watcher records every
+``vitals_from_server`` the server emits, and the JSON report contains
+end-to-end latency, the emotions each device produced and, for synthesized
+scenarios, how often they matched the scripted emotion:
+
+    python simulate_vitals.py --email me@example.com --password secret --devices 20 --rate 5
+    python simulate_vitals.py --email me@example.com --password secret --replay session.csv --speed 4
+    python simulate_vitals.py --email me@example.com --password secret --format binary --batch 10
+"""
+import sys
+import csv
+import json
+import hashlib
+import time
+import argparse
+import threading
+from collections import Counter, defaultdict
+
+import numpy as np
+import socketio
+
+from bench_common import login, pair_device, summarize, unpair_device
+from vitals_protocol import encode_vitals
+
+# Typical (bpm, hrv) per emotion under the default threshold table
+PROFILES = {
+    "neutral": (78.0, 35.0),
+    "happy": (96.0, 50.0),
+    "angry": (112.0, 18.0),
+    "sad": (62.0, 22.0),
+}
+DEFAULT_SCENARIO = ["neutral", "happy", "neutral", "angry", "sad", "neutral"]
+
+
+def synthesize(rng, scenario, phase_seconds, rate, duration, noise=(3.0, 2.0)):
+    """(t, bpm, hrv, expected emotion) arrays for one device following ``scenario``."""
+    t = np.arange(0.0, duration, 1.0 / rate)
+    phase = (t // phase_seconds).astype(int) % len(scenario)
+    expected = np.array(scenario)[phase]
+    targets = np.array([PROFILES[e] for e in scenario])[phase]
+    bpm = targets[:, 0] + rng.normal(0.0, noise[0], t.size)
+    hrv = np.clip(targets[:, 1] + rng.normal(0.0, noise[1], t.size), 1.0, None)
+    return t, bpm, hrv, expected
+
+
+def load_trace(path):
+    """Recorded traces from a CSV with t,bpm,hrv[,device] columns: {device: (t, bpm, hrv)}."""
+    rows = defaultdict(list)
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            rows[row.get("device") or "replay"].append((float(row["t"]), float(row["bpm"]), float(row["hrv"])))
+    traces = {}
+    for device, samples in rows.items():
+        data = np.array(sorted(samples))
+        traces[device] = (data[:, 0] - data[0, 0], data[:, 1], data[:, 2])
+    return traces
+
+
+def replay_device_id(name, copy):
+    """Id for copy ``copy`` of a recorded device that fits the 16 ASCII character pairing limit."""
+    device_id = f"{name}-{copy}"
+    if len(device_id) <= 16 and device_id.isascii():
+        return device_id
+    suffix = f"-{copy}"
+    return hashlib.sha1(name.encode("utf-8")).hexdigest()[:max(4, 16 - len(suffix))] + suffix
+
+
+class Watcher:
+    """Logged-in client that records what the server emits per device."""
+
+    def __init__(self, url, cookie):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.events = defaultdict(list)        # device_id -> [(receive time, emotion)]
+        self.client = socketio.Client(reconnection=False)
+        self.client.on("vitals_from_server", self._on_vitals, namespace="/hardware")
+        self.client.connect(url, namespaces=["/hardware"], headers={"Cookie": cookie})
+
+    def _on_vitals(self, data):
+        now = time.time()
+        sent = data.get("client_ts") or data.get("timestamp")
+        with self.lock:
+            if sent:
+                self.latencies.append(now - sent)
+            self.events[data.get("device_id")].append((now, data.get("detected_emotion")))
+
+    def close(self):
+        self.client.disconnect()
+
+
+def run_device(url, device_id, auth, t, bpm, hrv, speed, fmt, batch, sent_log, stop):
+    """Send one device's trace in real time (divided by ``speed``)."""
+    client = socketio.Client(reconnection=False)
+    client.connect(url, namespaces=["/hardware"], auth=auth)
+    start = time.time()
+    log = sent_log[device_id]
+    try:
+        i = 0
+        while i < len(t) and not stop.is_set():
+            j = min(len(t), i + (batch if fmt == "binary" else 1))
+            due = start + t[j - 1] / speed
+            stop.wait(max(0.0, due - time.time()))
+            now = time.time()
+            if fmt == "binary":
+                # samples keep their spacing; the newest one is stamped "now"
+                offsets = np.round((t[i:j] - t[i]) / speed * 1000.0).astype(np.int64)
+                t0 = now - offsets[-1] / 1000.0
+                client.emit("vitals_update", encode_vitals(device_id, t0, offsets, bpm[i:j], hrv[i:j]),
+                            namespace="/hardware")
+            else:
+                client.emit("vitals_update", {"bpm": round(float(bpm[i]), 1), "hrv": round(float(hrv[i]), 1),
+                                              "client_ts": now}, namespace="/hardware")
+            log.append((now, j - i))
+            i = j
+    finally:
+        client.disconnect()
+
+
+def run_simulation(url, email, password, devices=5, rate=5.0, duration=30.0, replay=None, speed=1.0,
+                   fmt="dict", batch=10, scenario=None, phase_seconds=5.0, seed=0):
+    cookie = login(url, email, password)
+    watcher = Watcher(url, cookie)
+
+    expected = {}
+    traces = {}
+    if replay:
+        for name, (t, bpm, hrv) in load_trace(replay).items():
+            for copy in range(devices):
+                traces[replay_device_id(name, copy)] = (t, bpm, hrv)
+    else:
+        scenario = scenario or DEFAULT_SCENARIO
+        for i in range(devices):
+            rng = np.random.default_rng(seed + i)
+            t, bpm, hrv, exp = synthesize(rng, scenario, phase_seconds, rate, duration)
+            traces[f"sim-{i}"] = (t, bpm, hrv)
+            expected[f"sim-{i}"] = (t, exp)
+
+    sent_log = defaultdict(list)
+    stop = threading.Event()
+    paired = []
+    try:
+        for device_id in traces:
+            paired.append(pair_device(url, cookie, device_id))
+        threads = [
+            threading.Thread(target=run_device, daemon=True,
+                             args=(url, auth["device_id"], auth, *traces[auth["device_id"]], speed, fmt, batch,
+                                   sent_log, stop))
+            for auth in paired
+        ]
+        started = time.time()
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            stop.set()
+        time.sleep(1.0)                                 # last UI tick
+        elapsed = time.time() - started
+    finally:
+        stop.set()
+        watcher.close()
+        # the virtual devices must not stay paired to the real account
+        for auth in paired:
+            unpair_device(url, cookie, auth["device_id"])
+
+    per_device = {}
+    for device_id in traces:
+        received = watcher.events.get(device_id, [])
+        emotions = [e for _, e in received]
+        changes = [e for k, e in enumerate(emotions) if k == 0 or e != emotions[k - 1]]
+        report = {
+            "samples_sent": sum(n for _, n in sent_log[device_id]),
+            "messages_sent": len(sent_log[device_id]),
+            "updates_received": len(received),
+            "emotion_counts": dict(Counter(emotions)),
+            "emotion_sequence": changes,
+        }
+        if device_id in expected and received:
+            t_exp, exp = expected[device_id]
+            device_start = sent_log[device_id][0][0] if sent_log[device_id] else started
+            idx = np.searchsorted(t_exp, [(r - device_start) * speed for r, _ in received], side="right") - 1
+            hits = sum(1 for k, (_, e) in zip(idx, received) if k >= 0 and exp[k] == e)
+            report["expected_match"] = round(hits / len(received), 3)
+        per_device[device_id] = report
+
+    return {
+        "url": url,
+        "config": {"devices": len(traces), "rate_hz": rate, "duration": duration, "replay": replay,
+                   "speed": speed, "format": fmt, "batch": batch if fmt == "binary" else 1,
+                   "scenario": None if replay else (scenario or DEFAULT_SCENARIO), "seed": seed},
+        "elapsed_seconds": round(elapsed, 2),
+        "latency": summarize(watcher.latencies),
+        "devices": per_device,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Synthesize or replay vitals for virtual devices against /hardware.")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--email", required=True, help="account the virtual devices belong to")
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--devices", type=int, default=5, help="virtual devices (copies of each trace when replaying)")
+    parser.add_argument("--rate", type=float, default=5.0, help="synthesized samples per second per device")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of synthesized data")
+    parser.add_argument("--scenario", nargs="+", choices=sorted(PROFILES), default=None,
+                        help="emotions the synthesized vitals cycle through")
+    parser.add_argument("--phase-seconds", type=float, default=5.0, help="length of each scenario phase")
+    parser.add_argument("--replay", help="CSV trace with t,bpm,hrv[,device] columns")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier")
+    parser.add_argument("--format", choices=["dict", "binary"], default="dict")
+    parser.add_argument("--batch", type=int, default=10, help="samples per binary message")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = run_simulation(
+        args.url.rstrip("/"), args.email, args.password,
+        devices=max(1, args.devices), rate=max(0.1, args.rate), duration=args.duration,
+        replay=args.replay, speed=max(0.01, args.speed), fmt=args.format, batch=max(1, args.batch),
+        scenario=args.scenario, phase_seconds=args.phase_seconds, seed=args.seed,
+    )
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+        print(f"Simulation report written to {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
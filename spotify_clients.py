@@ -0,0 +1,120 @@
+# spotify_clients.py
+"""
+Per-user Spotify clients over one pooled, keep-alive HTTP session.
+
+``spotipy.Spotify(auth=token)`` opens a new session (and TCP + TLS
+connection) per client, so building one per request pays the handshake on
+every call. ``SpotifyClientPool`` keeps one client per user on a shared
+``requests.Session`` whose adapter holds at most ``pool_maxsize`` idle
+connections per host. A user's client is replaced when their token changes
+and dropped after ``idle_timeout`` seconds without use.
+
+``api_base`` and ``accounts_base`` redirect Web API and token calls, e.g. to
+the local stand-in in fake_spotify.py for offline benchmarks.
+"""
+import time
+import threading
+
+import requests
+import spotipy
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Same retry policy spotipy installs on its own sessions
+_RETRY = Retry(
+    total=3,
+    connect=None,
+    read=False,
+    status=3,
+    backoff_factor=0.3,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset(["GET", "POST", "PUT", "DELETE"]),
+)
+
+
+def pooled_session(pool_connections=4, pool_maxsize=16):
+    """A requests.Session with bounded keep-alive pools; safe to share across threads for spotipy calls."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=_RETRY)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class _Client:
+    __slots__ = ("token", "sp", "used_at")
+
+    def __init__(self, token, sp, now):
+        self.token = token
+        self.sp = sp
+        self.used_at = now
+
+
+class SpotifyClientPool:
+    """Caches one ``spotipy.Spotify`` per user key, all sharing ``session``."""
+
+    def __init__(self, session=None, idle_timeout=900, requests_timeout=10, pool_maxsize=16, prune_interval=60,
+                 api_base=None, accounts_base=None):
+        self.session = session or pooled_session(pool_maxsize=pool_maxsize)
+        self.api_base = api_base.rstrip("/") + "/" if api_base else None
+        self.accounts_base = accounts_base.rstrip("/") if accounts_base else None
+        self.idle_timeout = idle_timeout
+        self.requests_timeout = requests_timeout
+        self.prune_interval = prune_interval
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._pruned_at = time.time()
+        self.stats = {"hits": 0, "created": 0, "token_changes": 0, "evicted_idle": 0}
+
+    def client(self, **kwargs):
+        """A client on the shared session that is not tied to a user, e.g. with an ``auth_manager``."""
+        sp = spotipy.Spotify(requests_session=self.session, requests_timeout=self.requests_timeout, **kwargs)
+        if self.api_base:
+            sp.prefix = self.api_base
+        if kwargs.get("auth_manager") is not None:
+            self.auth_manager(kwargs["auth_manager"])
+        return sp
+
+    def auth_manager(self, manager):
+        """Point a spotipy OAuth/client-credentials manager at ``accounts_base``, if one is set."""
+        if self.accounts_base:
+            manager.OAUTH_TOKEN_URL = f"{self.accounts_base}/api/token"
+            if hasattr(manager, "OAUTH_AUTHORIZE_URL"):
+                manager.OAUTH_AUTHORIZE_URL = f"{self.accounts_base}/authorize"
+        return manager
+
+    def get(self, key, token):
+        """The cached client for ``key``, rebuilt if ``token`` differs from the one it was made with."""
+        now = time.time()
+        with self._lock:
+            if now - self._pruned_at >= self.prune_interval:
+                self._prune(now)
+            entry = self._clients.get(key)
+            if entry is not None and entry.token == token:
+                entry.used_at = now
+                self.stats["hits"] += 1
+                return entry.sp
+            if entry is not None:
+                self.stats["token_changes"] += 1
+            self.stats["created"] += 1
+            sp = self.client(auth=token)
+            self._clients[key] = _Client(token, sp, now)
+            return sp
+
+    def evict(self, key):
+        """Drop a user's client, e.g. after unlinking Spotify."""
+        with self._lock:
+            self._clients.pop(key, None)
+
+    def _prune(self, now):
+        idle = [key for key, entry in self._clients.items() if now - entry.used_at >= self.idle_timeout]
+        for key in idle:
+            del self._clients[key]
+        self.stats["evicted_idle"] += len(idle)
+        self._pruned_at = now
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["clients"] = len(self._clients)
+        return stats
@@ -0,0 +1,410 @@
+# spotify_recommender.py
+"""
+Spotify playlist recommendations shared by the web app and the desktop player.
+
+``find_playlist()`` is the search-and-rank pipeline: a few playlist searches,
+a detail lookup per hit, keep the ones whose name/description mention both the
+language and the emotion, pick the most followed. Searches and detail lookups
+run concurrently on a shared bounded thread pool under one overall deadline;
+when it expires the best candidate found so far wins. The answer for a
+(language, emotion) pair is the same for every user, so ``recommend_playlist()``
+serves it from a ``RecommendationCache`` (TTL + LRU in process, optionally
+backed by a Mongo collection that every server process shares), and a
+``PlaylistRefresher`` can keep the rankings for every pair precomputed so live
+requests never have to search.
+"""
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+LANGUAGE_SYNONYMS = {
+    "english": ["english", "hollywood"],
+    "hindi": ["hindi", "bollywood"],
+    "malayalam": ["malayalam", "mollywood"],
+    "tamil": ["tamil", "kollywood"],
+}
+EMOTION_SYNONYMS = {
+    "happy": ["happy", "joy", "positive", "vibe", "energetic"],
+    "sad": ["sad", "melancholy", "blue", "down", "poignant"],
+    "angry": ["angry", "rage", "furious", "aggressive"],
+    "neutral": ["neutral", "calm", "chill", "relaxed", "serene"],
+}
+PLAYLIST_FIELDS = "id,uri,name,description,followers,external_urls"
+LOOKUP_WORKERS = 8                             # concurrent Spotify calls across all recommendations
+LOOKUP_DEADLINE = 6.0                          # seconds for the whole search + detail phase
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _lookup_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=LOOKUP_WORKERS, thread_name_prefix="spotify-lookup")
+        return _pool
+
+
+def _gather(futures, deadline, on_result):
+    """Feed finished futures to ``on_result`` until all are done or ``deadline`` passes.
+
+    Returns how many completed; the rest are cancelled (or left to finish unobserved).
+    """
+    pending = set(futures)
+    completed = 0
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            completed += 1
+            on_result(futures[future], future)
+    for future in pending:
+        future.cancel()
+    return completed
+
+
+def _slim(playlist):
+    """Only the fields callers use, so cached entries stay small and JSON/BSON friendly."""
+    return {
+        "id": playlist.get("id"),
+        "uri": playlist.get("uri"),
+        "name": playlist.get("name") or "Playlist",
+        "description": playlist.get("description") or "",
+        "followers": {"total": (playlist.get("followers") or {}).get("total", 0)},
+        "external_urls": {"spotify": (playlist.get("external_urls") or {}).get("spotify")},
+    }
+
+
+def rank_playlists(sp, language, emotion, log=print, deadline=None, report=None):
+    """Playlists matching language and emotion, most followed first (a single fallback pick if none match).
+
+    ``deadline`` bounds the search and detail phase in seconds. If ``report``
+    is a dict it is filled with lookup counts and timing.
+    """
+    started = time.monotonic()
+    stop_at = started + (deadline if deadline is not None else LOOKUP_DEADLINE)
+    pool = _lookup_pool()
+    lang_keywords = LANGUAGE_SYNONYMS.get(language, [language])
+    emo_keywords = EMOTION_SYNONYMS.get(emotion, [emotion])
+
+    query_templates = [f"{language} {emotion}", f"{emotion} {language}", f"{language} {emotion} playlist", f"{emotion} vibes"]
+    seen_ids = set()
+    log(f"🔎 Dynamically searching Spotify for a {language} {emotion} playlist...")
+
+    def on_search(q, future):
+        try:
+            items = future.result().get("playlists", {}).get("items", []) or []
+            for p in items:
+                if p and p.get("id"):
+                    seen_ids.add(p["id"])
+        except Exception as e:
+            log(f"Spotify search error for '{q}': {e}")
+
+    searches = {pool.submit(sp.search, q=q, type="playlist", limit=15): q for q in query_templates}
+    searches_done = _gather(searches, stop_at, on_search)
+
+    valid_candidates = []
+    lookups_done = 0
+
+    def on_details(pid, future):
+        try:
+            details = future.result()
+            text = f"{(details.get('name') or '').lower()} {(details.get('description') or '').lower()}"
+            if any(k in text for k in lang_keywords) and any(k in text for k in emo_keywords):
+                valid_candidates.append(details)
+        except Exception as e:
+            log(f"Error fetching playlist details for {pid}: {e}")
+
+    if seen_ids:
+        log(f"Found {len(seen_ids)} potential playlists. Fetching details...")
+        lookups = {pool.submit(sp.playlist, pid, fields=PLAYLIST_FIELDS): pid for pid in seen_ids}
+        lookups_done = _gather(lookups, stop_at, on_details)
+        if lookups_done < len(lookups):
+            log(f"Deadline reached: {lookups_done}/{len(lookups)} playlist lookups finished in time.")
+
+    report = report if report is not None else {}
+    report.update({"searches": len(query_templates), "searches_completed": searches_done,
+                   "lookups": len(seen_ids), "lookups_completed": lookups_done,
+                   "candidates": len(valid_candidates), "fallback": False})
+
+    if valid_candidates:
+        log(f"Found {len(valid_candidates)} relevant playlists. Ranking by popularity.")
+        valid_candidates.sort(key=lambda p: (p.get("followers") or {}).get("total", 0), reverse=True)
+        report["elapsed"] = round(time.monotonic() - started, 3)
+        return [_slim(p) for p in valid_candidates]
+
+    # the fallback shares the deadline; once it has passed the caller gets nothing rather than a late pick
+    report["fallback"] = True
+    ranked = []
+    if time.monotonic() < stop_at:
+        log("Primary search failed. Trying fallback search...")
+        future = pool.submit(_fallback_pick, sp, language, emotion, log)
+        _gather({future: None}, stop_at, lambda _, f: ranked.extend(f.result()))
+    else:
+        log("Primary search failed and the lookup deadline has passed; skipping fallback search.")
+    report["elapsed"] = round(time.monotonic() - started, 3)
+    return ranked
+
+
+def _fallback_pick(sp, language, emotion, log):
+    """A single loosely matching playlist, for when no ranked candidate was found."""
+    for fallback_query in (f"{language} {emotion} playlist", f"{emotion} playlist"):
+        try:
+            results = sp.search(q=fallback_query, type="playlist", limit=1)
+            items = results.get("playlists", {}).get("items", []) or []
+            if items and items[0]:
+                return [_slim(sp.playlist(items[0]["id"], fields=PLAYLIST_FIELDS))]
+        except Exception as e:
+            log(f"Fallback Spotify search '{fallback_query}' failed: {e}")
+    return []
+
+
+def ranking_complete(report):
+    """True when every search and detail lookup finished in time and the ranking is not a fallback pick."""
+    return (report.get("searches_completed", 0) >= report.get("searches", 0)
+            and report.get("lookups_completed", 0) >= report.get("lookups", 0)
+            and not report.get("fallback"))
+
+
+def find_playlist(sp, language, emotion, log=print, deadline=None, report=None):
+    """The most followed playlist matching language and emotion, or None."""
+    ranked = rank_playlists(sp, language, emotion, log=log, deadline=deadline, report=report)
+    return ranked[0] if ranked else None
+
+
+class RecommendationCache:
+    """TTL + LRU cache of ranked playlists keyed by (language, emotion).
+
+    With a Mongo ``collection`` a local miss falls through to the shared
+    document (if it has not expired) and every store is written through, so
+    one process's search serves all of them.
+    """
+
+    def __init__(self, ttl=3600, max_entries=256, collection=None):
+        self.ttl = ttl
+        self.max_entries = max(1, int(max_entries))
+        self.collection = collection
+        self._entries = OrderedDict()          # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "shared_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    @staticmethod
+    def key(language, emotion):
+        return f"{language.lower()}:{emotion.lower()}"
+
+    def get(self, language, emotion):
+        key = self.key(language, emotion)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[1]
+            if entry:
+                del self._entries[key]
+        if self.collection is not None:
+            try:
+                doc = self.collection.find_one({"_id": key, "expires_at": {"$gt": now}})
+            except Exception as e:
+                print(f"Recommendation cache lookup failed: {e}")
+                doc = None
+            if doc:
+                self._store_local(key, doc["expires_at"], doc["value"])
+                with self._lock:
+                    self.stats["shared_hits"] += 1
+                return doc["value"]
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, language, emotion, value):
+        key = self.key(language, emotion)
+        expires_at = time.time() + self.ttl
+        self._store_local(key, expires_at, value)
+        with self._lock:
+            self.stats["stores"] += 1
+        if self.collection is not None:
+            try:
+                self.collection.replace_one({"_id": key}, {"_id": key, "value": value, "expires_at": expires_at}, upsert=True)
+            except Exception as e:
+                print(f"Recommendation cache write failed: {e}")
+
+    def invalidate(self, language, emotion):
+        key = self.key(language, emotion)
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.collection is not None:
+            try:
+                self.collection.delete_one({"_id": key})
+            except Exception as e:
+                print(f"Recommendation cache delete failed: {e}")
+
+    def _store_local(self, key, expires_at, value):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+        return stats
+
+
+def _entry(candidates):
+    return {"candidates": candidates, "computed_at": time.time()}
+
+
+def _valid_pick(entry, max_age=None):
+    """First usable candidate of a cached entry, or None if the entry is empty or too old."""
+    if not entry or not entry.get("candidates"):
+        return None
+    if max_age is not None and time.time() - entry.get("computed_at", 0) > max_age:
+        return None
+    for candidate in entry["candidates"]:
+        if candidate.get("id") and candidate.get("uri"):
+            return candidate
+    return None
+
+
+def recommend_playlist(sp, language, emotion, cache=None, log=print, deadline=None, report=None, max_age=None):
+    """Best playlist for (language, emotion): a cached ranking if valid, else a live search.
+
+    Only complete rankings are cached: a pick made when the deadline cut the
+    searches or lookups short, or a fallback pick, is returned but not kept
+    for the whole TTL.
+    """
+    language, emotion = language.lower(), emotion.lower()
+    if cache is not None:
+        pick = _valid_pick(cache.get(language, emotion), max_age)
+        if pick:
+            return pick
+    report = report if report is not None else {}
+    ranked = rank_playlists(sp, language, emotion, log=log, deadline=deadline, report=report)
+    if ranked and ranking_complete(report) and cache is not None:
+        cache.put(language, emotion, _entry(ranked))
+    return ranked[0] if ranked else None
+
+
+class PlaylistRefresher:
+    """Background thread that re-ranks every (language, emotion) pair into the cache.
+
+    ``client_fn()`` returns a Spotify client (called once per cycle, so it can
+    hand out a fresh app token). With the cache TTL longer than ``interval``
+    live lookups are served from precomputed rankings; ``get_status()``
+    reports per-pair refresh times, durations, failures and staleness.
+    """
+
+    def __init__(self, client_fn, cache, languages=None, emotions=None, interval=3600, deadline=None,
+                 log=print):
+        self.client_fn = client_fn
+        self.cache = cache
+        self.languages = list(languages or LANGUAGE_SYNONYMS)
+        self.emotions = list(emotions or EMOTION_SYNONYMS)
+        self.interval = interval
+        self.deadline = deadline
+        self.log = log
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._running = False
+        self._pairs = {}                       # key -> per-pair status
+        self.stats = {"cycles": 0, "refreshes": 0, "failures": 0, "last_cycle_started": None,
+                      "last_cycle_seconds": None}
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="playlist-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+
+    def refresh_now(self):
+        """Start the next cycle immediately."""
+        self._wake.set()
+
+    def refresh_pair(self, sp, language, emotion):
+        key = self.cache.key(language, emotion)
+        report = {}
+        started = time.time()
+        try:
+            ranked = rank_playlists(sp, language, emotion, log=lambda *_: None, deadline=self.deadline, report=report)
+            if not ranked:
+                error = "no playlists found"
+            elif not ranking_complete(report):
+                # keep the previous ranking rather than replace it with a partial or fallback one
+                ranked, error = [], "incomplete ranking (deadline or fallback)"
+            else:
+                error = None
+        except Exception as e:
+            ranked, error = [], str(e)
+        duration = time.time() - started
+        with self._lock:
+            status = self._pairs.setdefault(key, {"refreshed_at": None, "failures": 0})
+            status.update({"last_attempt": started, "duration": round(duration, 3), "error": error,
+                           "candidates": len(ranked), "lookups": report.get("lookups"),
+                           "lookups_completed": report.get("lookups_completed")})
+            if ranked:
+                status["refreshed_at"] = started
+                self.stats["refreshes"] += 1
+            else:
+                status["failures"] += 1
+                self.stats["failures"] += 1
+        if ranked:
+            # keep the previous ranking when the refresh failed; it is still better than nothing
+            self.cache.put(language, emotion, _entry(ranked))
+        else:
+            self.log(f"Playlist refresh for {language} {emotion} failed: {error}")
+        return bool(ranked)
+
+    def _loop(self):
+        while self._running:
+            cycle_start = time.time()
+            with self._lock:
+                self.stats["last_cycle_started"] = cycle_start
+            try:
+                sp = self.client_fn()
+            except Exception as e:
+                sp = None
+                self.log(f"Playlist refresher: no Spotify client ({e})")
+            if sp is not None:
+                for language in self.languages:
+                    for emotion in self.emotions:
+                        if not self._running:
+                            return
+                        self.refresh_pair(sp, language, emotion)
+            with self._lock:
+                self.stats["cycles"] += 1
+                self.stats["last_cycle_seconds"] = round(time.time() - cycle_start, 2)
+            self._wake.wait(max(1.0, self.interval - (time.time() - cycle_start)) if sp is not None else 60.0)
+            self._wake.clear()
+
+    def get_status(self):
+        now = time.time()
+        with self._lock:
+            pairs = {}
+            for key, status in self._pairs.items():
+                entry = dict(status)
+                entry["age_seconds"] = round(now - status["refreshed_at"], 1) if status["refreshed_at"] else None
+                entry["stale"] = status["refreshed_at"] is None or now - status["refreshed_at"] > 2 * self.interval
+                pairs[key] = entry
+            status = dict(self.stats)
+        status.update({
+            "interval": self.interval,
+            "pairs": pairs,
+            "stale_pairs": sorted(k for k, v in pairs.items() if v["stale"]),
+            "missing_pairs": sorted(self.cache.key(l, e) for l in self.languages for e in self.emotions
+                                    if self.cache.key(l, e) not in pairs),
+        })
+        return status
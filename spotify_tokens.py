@@ -0,0 +1,143 @@
+# spotify_tokens.py
+"""
+In-process cache of each user's Spotify access token and premium status.
+
+A cached entry is served without touching Mongo or Spotify until its ``ttl``
+runs out or the token gets within ``refresh_margin`` seconds of expiring.
+Reloads and refreshes are single-flight per user: one request does the work
+while concurrent ones either keep using the still-valid token or wait for the
+result, so a burst of polls never refreshes the same token twice.
+"""
+import time
+import threading
+
+
+class _Entry:
+    __slots__ = ("token", "refresh_token", "expires_at", "is_premium", "loaded_at", "premium_checked_at", "lock")
+
+    def __init__(self):
+        self.token = None
+        self.refresh_token = None
+        self.expires_at = 0
+        self.is_premium = False
+        self.loaded_at = 0.0
+        self.premium_checked_at = 0.0
+        self.lock = threading.Lock()
+
+
+class SpotifyTokenCache:
+    """Caches (token, is_premium) per user email.
+
+    ``load_fn(email)`` returns the user's document (or None), ``refresh_fn(refresh_token)``
+    returns new token info with ``access_token``/``expires_at``, ``save_fn(email, fields)``
+    persists changed fields and ``premium_fn(token)`` returns whether the account is premium.
+    """
+
+    def __init__(self, load_fn, refresh_fn, save_fn, premium_fn, ttl=300, premium_ttl=3600, refresh_margin=120,
+                 log=print):
+        self.load_fn = load_fn
+        self.refresh_fn = refresh_fn
+        self.save_fn = save_fn
+        self.premium_fn = premium_fn
+        self.ttl = ttl
+        self.premium_ttl = premium_ttl
+        self.refresh_margin = refresh_margin
+        self.log = log
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "loads": 0, "refreshes": 0, "refresh_failures": 0, "premium_checks": 0}
+
+    def _entry(self, email):
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is None:
+                entry = self._entries[email] = _Entry()
+            return entry
+
+    def _fresh(self, entry, now):
+        return (entry.loaded_at and now - entry.loaded_at < self.ttl
+                and (entry.token is None or now < entry.expires_at - self.refresh_margin)
+                and now - entry.premium_checked_at < self.premium_ttl)
+
+    def get(self, email):
+        """Return (token, is_premium); token is None when Spotify is not linked or cannot be refreshed."""
+        entry = self._entry(email)
+        now = time.time()
+        if self._fresh(entry, now):
+            self._count("hits")
+            return entry.token, entry.is_premium
+
+        if entry.token and now < entry.expires_at:
+            # still usable: one caller refreshes, everyone else keeps the current token meanwhile
+            if not entry.lock.acquire(blocking=False):
+                self._count("hits")
+                return entry.token, entry.is_premium
+        else:
+            entry.lock.acquire()               # nothing usable yet: wait for the single refresh
+        try:
+            now = time.time()
+            if self._fresh(entry, now):
+                return entry.token, entry.is_premium
+            self._reload(email, entry, now)
+            return entry.token, entry.is_premium
+        finally:
+            entry.lock.release()
+
+    def invalidate(self, email):
+        """Forget a user's entry, e.g. after linking or unlinking Spotify."""
+        with self._lock:
+            self._entries.pop(email, None)
+
+    def _reload(self, email, entry, now):
+        if now - entry.loaded_at >= self.ttl or not entry.refresh_token:
+            self._count("loads")
+            user_data = self.load_fn(email) or {}
+            entry.token = user_data.get("spotify_access_token") or None
+            entry.refresh_token = user_data.get("spotify_refresh_token") or None
+            entry.expires_at = user_data.get("spotify_expires_at") or 0
+            entry.is_premium = bool(user_data.get("is_spotify_premium", False))
+            entry.loaded_at = now
+            if not all([entry.token, entry.refresh_token, entry.expires_at]):
+                entry.token = None
+                entry.premium_checked_at = now     # nothing to check until the next load
+                return
+
+        if now >= entry.expires_at - self.refresh_margin:
+            try:
+                info = self.refresh_fn(entry.refresh_token)
+                entry.token = info["access_token"]
+                entry.expires_at = info["expires_at"]
+                fields = {"spotify_access_token": entry.token, "spotify_expires_at": entry.expires_at}
+                if info.get("refresh_token"):
+                    entry.refresh_token = fields["spotify_refresh_token"] = info["refresh_token"]
+                self.save_fn(email, fields)
+                self._count("refreshes")
+                self.log(f"Successfully refreshed Spotify token for {email}")
+            except Exception as e:
+                self._count("refresh_failures")
+                self.log(f"Could not refresh Spotify token for {email}: {e}")
+                if now >= entry.expires_at:
+                    entry.token = None
+                    entry.loaded_at = 0.0          # retry on the next call
+                    return
+
+        if now - entry.premium_checked_at >= self.premium_ttl:
+            try:
+                is_premium = bool(self.premium_fn(entry.token))
+                self._count("premium_checks")
+                if is_premium != entry.is_premium:
+                    self.save_fn(email, {"is_spotify_premium": is_premium})
+                entry.is_premium = is_premium
+            except Exception:
+                pass
+            entry.premium_checked_at = now
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["users"] = len(self._entries)
+        return stats
@@ -0,0 +1,80 @@
+# vitals_classifier.py
+"""
+Vectorized vitals -> emotion classification.
+
+Rules are a table of BPM/HRV ranges checked in order; the first matching row
+wins and anything unmatched is the default emotion. Classification works on
+whole NumPy arrays, and windows are smoothed (median by default) before the
+table is applied, so one noisy beat cannot flip the result.
+"""
+import numpy as np
+
+# (emotion, bpm above, bpm below, hrv above, hrv below); bounds are exclusive, None = unbounded
+DEFAULT_RULES = [
+    ("angry", 100, None, None, 25),
+    ("happy", 90, None, 40, None),
+    ("sad", None, 70, None, 30),
+]
+DEFAULT_EMOTION = "neutral"
+
+
+class VitalsClassifier:
+    """Maps BPM/HRV arrays to emotions with a configurable threshold table."""
+
+    def __init__(self, rules=None, default=DEFAULT_EMOTION, smoothing="median", window=8):
+        rules = rules or DEFAULT_RULES
+        self.labels = [r[0] for r in rules] + [default]
+        self.default = default
+        bounds = np.array([[np.nan if v is None else v for v in r[1:]] for r in rules], dtype=np.float64)
+        self._bpm_lo = np.nan_to_num(bounds[:, 0], nan=-np.inf)[:, None]
+        self._bpm_hi = np.nan_to_num(bounds[:, 1], nan=np.inf)[:, None]
+        self._hrv_lo = np.nan_to_num(bounds[:, 2], nan=-np.inf)[:, None]
+        self._hrv_hi = np.nan_to_num(bounds[:, 3], nan=np.inf)[:, None]
+        if smoothing not in ("median", "mean"):
+            raise ValueError(f"Unknown smoothing: {smoothing}")
+        self._reduce = np.median if smoothing == "median" else np.mean
+        self.window = max(1, int(window))
+
+    def classify_indices(self, bpm, hrv):
+        """Rule index per sample (``len(rules)`` for the default emotion)."""
+        bpm = np.asarray(bpm, dtype=np.float64)
+        hrv = np.asarray(hrv, dtype=np.float64)
+        # (rules, samples) boolean matrix; argmax picks the first matching rule
+        match = (bpm > self._bpm_lo) & (bpm < self._bpm_hi) & (hrv > self._hrv_lo) & (hrv < self._hrv_hi)
+        first = match.argmax(axis=0)
+        return np.where(match.any(axis=0), first, len(self.labels) - 1)
+
+    def classify(self, bpm, hrv):
+        """Emotion label per sample."""
+        return [self.labels[i] for i in self.classify_indices(bpm, hrv)]
+
+    def classify_one(self, bpm, hrv):
+        return self.labels[int(self.classify_indices([bpm], [hrv])[0])]
+
+    def classify_window(self, bpm, hrv):
+        """One emotion for a window of samples, after smoothing."""
+        bpm = np.asarray(bpm, dtype=np.float64)
+        if bpm.size == 0:
+            return self.default
+        return self.classify_one(self._reduce(bpm), self._reduce(np.asarray(hrv, dtype=np.float64)))
+
+    def classify_series(self, bpm, hrv, window=None, step=None):
+        """Smoothed emotion for every full window of a recorded series.
+
+        Returns (window end indices, labels). Windows are ``window`` samples
+        long and start every ``step`` samples (default: non-overlapping).
+        """
+        window = max(1, int(window or self.window))
+        step = max(1, int(step or window))
+        bpm = np.asarray(bpm, dtype=np.float64)
+        hrv = np.asarray(hrv, dtype=np.float64)
+        if bpm.size < window:
+            if not bpm.size:
+                return np.empty(0, dtype=np.int64), []
+            return np.array([bpm.size - 1]), [self.classify_window(bpm, hrv)]
+        bpm_windows = np.lib.stride_tricks.sliding_window_view(bpm, window)[::step]
+        hrv_windows = np.lib.stride_tricks.sliding_window_view(hrv, window)[::step]
+        smoothed_bpm = self._reduce(bpm_windows, axis=1)
+        smoothed_hrv = self._reduce(hrv_windows, axis=1)
+        ends = np.arange(bpm_windows.shape[0]) * step + window - 1
+        return ends, self.classify(smoothed_bpm, smoothed_hrv)
@@ -0,0 +1,71 @@
+# vitals_devices.py
+"""
+Pairing records for hardware vitals devices.
+
+A logged-in user pairs a device id with their account and receives a
+random token once; only its SHA-256 hash is stored. The device presents
+``device_id`` and ``token`` when it connects to ``/hardware``, and the
+server takes the owner from the pairing record, never from the device, so
+a client cannot put samples into another user's room or history.
+"""
+import hmac
+import time
+import hashlib
+import secrets
+
+
+class DevicePairingError(ValueError):
+    """Raised when a device id cannot be paired to the requesting user."""
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class DeviceRegistry:
+    """Device pairings in a Mongo collection: {_id: device_id, owner, name, token_hash, paired_at, last_seen_at}."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.collection.create_index("owner")
+
+    def pair(self, owner, device_id, name=None):
+        """Pair (or re-pair) ``device_id`` to ``owner`` and return its new token.
+
+        Re-pairing a device the user already owns rotates its token; a device
+        paired to someone else must be unpaired by its owner first.
+        """
+        device_id = (device_id or "").strip()
+        if not device_id or len(device_id) > 16 or not device_id.isascii():
+            raise DevicePairingError("device_id must be 1-16 ASCII characters")
+        existing = self.collection.find_one({"_id": device_id}, {"owner": 1})
+        if existing and existing.get("owner") != owner:
+            raise DevicePairingError("device is paired to another account")
+        token = secrets.token_urlsafe(24)
+        self.collection.update_one(
+            {"_id": device_id},
+            {"$set": {"owner": owner, "name": name or device_id, "token_hash": hash_token(token),
+                      "paired_at": time.time()}},
+            upsert=True,
+        )
+        return token
+
+    def unpair(self, owner, device_id):
+        return self.collection.delete_one({"_id": device_id, "owner": owner}).deleted_count > 0
+
+    def verify(self, device_id, token):
+        """The owner's email when ``token`` matches the device's pairing, else None."""
+        if not device_id or not token:
+            return None
+        record = self.collection.find_one({"_id": device_id})
+        if not record or not hmac.compare_digest(record.get("token_hash", ""), hash_token(token)):
+            return None
+        self.collection.update_one({"_id": device_id}, {"$set": {"last_seen_at": time.time()}})
+        return record["owner"]
+
+    def devices(self, owner):
+        return [
+            {"device_id": d["_id"], "name": d.get("name"), "paired_at": d.get("paired_at"),
+             "last_seen_at": d.get("last_seen_at")}
+            for d in self.collection.find({"owner": owner}, {"token_hash": 0}).sort("paired_at", 1)
+        ]
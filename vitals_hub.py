@@ -0,0 +1,208 @@
+# vitals_hub.py
+"""
+Routing and rate limiting for hardware vitals.
+
+ESP32 devices can send samples much faster than a browser needs to redraw.
+VitalsHub keeps the newest sample per device and a background task emits at
+most one update per device per UI tick to the room of the user who owns it
+(``user:<email>``), so a sample reaches only that user's browsers and bursts
+collapse into a single message. The owner comes from the device's pairing,
+checked once when it connects (see vitals_devices.py); samples cannot
+change it. Unpaired devices, where the server allows them, go to the
+shared ``unpaired`` room.
+
+Each device also keeps a fixed-size numpy ring buffer of its recent
+(timestamp, bpm, hrv) samples for windowed statistics.
+"""
+import time
+import threading
+
+import numpy as np
+
+
+class DeviceWindow:
+    """Fixed-capacity ring buffer of (timestamp, bpm, hrv) rows."""
+
+    def __init__(self, capacity=120):
+        self.capacity = max(1, int(capacity))
+        self._data = np.zeros((self.capacity, 3), dtype=np.float64)
+        self._next = 0
+        self.count = 0
+
+    def append(self, ts, bpm, hrv):
+        row = self._data[self._next]
+        row[0], row[1], row[2] = ts, bpm, hrv
+        self._next = (self._next + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def series(self):
+        """Return the buffered rows oldest-first as a new (n, 3) array."""
+        if self.count < self.capacity:
+            return self._data[:self.count].copy()
+        return np.roll(self._data, -self._next, axis=0)
+
+    def extend(self, ts, bpm, hrv):
+        """Append parallel arrays of samples in one vectorized write."""
+        n = len(ts)
+        if n >= self.capacity:
+            ts, bpm, hrv = ts[-self.capacity:], bpm[-self.capacity:], hrv[-self.capacity:]
+            n = self.capacity
+        index = np.arange(self._next, self._next + n) % self.capacity
+        self._data[index, 0] = ts
+        self._data[index, 1] = bpm
+        self._data[index, 2] = hrv
+        self._next = (self._next + n) % self.capacity
+        self.count = min(self.capacity, self.count + n)
+
+    def recent(self, n):
+        """(bpm, hrv) arrays of the newest ``n`` samples, in no particular order."""
+        n = min(int(n), self.count)
+        if n == self.count:
+            window = self._data[:self.count]
+        else:
+            window = self._data.take(np.arange(self._next - n, self._next) % self.capacity, axis=0)
+        return window[:, 1], window[:, 2]
+
+    def summary(self):
+        """Mean BPM/HRV over the window, or None when empty."""
+        if not self.count:
+            return None
+        window = self._data[:self.count]
+        means = window[:, 1:].mean(axis=0)
+        return {"samples": self.count, "bpm_avg": round(float(means[0]), 1), "hrv_avg": round(float(means[1]), 1)}
+
+
+class VitalsHub:
+    """Coalesces vitals per device and emits them at ``ui_rate_hz``.
+
+    ``emit_fn(room, payload)`` sends one update and ``classify_fn(bpm, hrv)``
+    maps the device's newest ``classify_window`` samples (two arrays) to one
+    emotion; it runs once per emitted update, not once per received sample.
+    """
+
+    UNPAIRED_ROOM = "unpaired"
+
+    def __init__(self, emit_fn, classify_fn, ui_rate_hz=4.0, window_size=120, classify_window=8):
+        self.emit_fn = emit_fn
+        self.classify_fn = classify_fn
+        self.classify_window = classify_window
+        self.interval = 1.0 / ui_rate_hz if ui_rate_hz else 0.0
+        self.window_size = window_size
+        self._lock = threading.Lock()
+        # Keyed by (owner, device_id): an unverified connection reusing a paired device's id
+        # must not share that device's window or pending update
+        self._devices = {}                     # (user, device_id) -> DeviceWindow
+        self._pending = {}                     # (user, device_id) -> (room, newest sample) since the last emit
+        self._sids = {}                        # hardware socket id -> (device_id, user, session_id)
+        self._running = False
+        self.stats = {"samples": 0, "emits": 0, "coalesced": 0}
+
+    @classmethod
+    def room_for(cls, user=None):
+        return f"user:{user}" if user else cls.UNPAIRED_ROOM
+
+    # --- devices ---
+    def bind(self, sid, device_id=None, user=None, session_id=None):
+        """Remember which device, owner and recording session a hardware connection belongs to."""
+        with self._lock:
+            self._sids[sid] = (device_id or sid, user, session_id or sid)
+
+    def unbind(self, sid):
+        with self._lock:
+            device_id, user, _ = self._sids.pop(sid, (None, None, None))
+            if device_id is not None and (user, device_id) not in ((u, d) for d, u, _ in self._sids.values()):
+                self._devices.pop((user, device_id), None)
+
+    def identity(self, sid):
+        """(device_id, user, session_id) the connection was bound with; samples cannot override it."""
+        with self._lock:
+            return self._sids.get(sid, (sid, None, sid))
+
+    # --- samples ---
+    def add_sample(self, device_id, bpm, hrv, user=None, ts=None, client_ts=None):
+        """Record one sample and mark its device for the next UI tick. Returns the room.
+
+        ``client_ts`` (the sender's clock) is passed through untouched so
+        clients can measure end-to-end latency.
+        """
+        ts = ts if ts is not None else time.time()
+        room = self.room_for(user)
+        key = (user, device_id)
+        with self._lock:
+            window = self._devices.get(key)
+            if window is None:
+                window = self._devices[key] = DeviceWindow(self.window_size)
+            window.append(ts, bpm, hrv)
+            self.stats["samples"] += 1
+            if key in self._pending:
+                self.stats["coalesced"] += 1
+            self._pending[key] = (room, bpm, hrv, ts, client_ts)
+        return room
+
+    def add_samples(self, device_id, ts, bpm, hrv, user=None):
+        """Record arrays of samples from one device (binary protocol). Returns the room."""
+        room = self.room_for(user)
+        if not len(ts):
+            return room
+        key = (user, device_id)
+        with self._lock:
+            window = self._devices.get(key)
+            if window is None:
+                window = self._devices[key] = DeviceWindow(self.window_size)
+            window.extend(ts, bpm, hrv)
+            self.stats["samples"] += len(ts)
+            self.stats["coalesced"] += len(ts) - 1 + (key in self._pending)
+            self._pending[key] = (room, float(bpm[-1]), float(hrv[-1]), float(ts[-1]), None)
+        return room
+
+    def window(self, device_id, user=None):
+        with self._lock:
+            window = self._devices.get((user, device_id))
+            return window.series() if window else None
+
+    def flush(self):
+        """Emit the newest pending sample of every device. Returns how many updates went out."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            payloads = []
+            for key, (room, bpm, hrv, ts, client_ts) in pending.items():
+                device_id = key[1]
+                window = self._devices.get(key)
+                recent = window.recent(self.classify_window) if window else ([bpm], [hrv])
+                payloads.append((room, recent, {
+                    "device_id": device_id,
+                    "bpm": bpm,
+                    "hrv": hrv,
+                    "timestamp": ts,
+                    "client_ts": client_ts,
+                    "window": window.summary() if window else None,
+                }))
+        for room, (recent_bpm, recent_hrv), payload in payloads:
+            payload["detected_emotion"] = self.classify_fn(recent_bpm, recent_hrv)
+            self.emit_fn(room, payload)
+        with self._lock:
+            self.stats["emits"] += len(payloads)
+        return len(payloads)
+
+    # --- background task ---
+    def run(self, sleep_fn=time.sleep):
+        """Emit loop; start it with ``socketio.start_background_task(hub.run, socketio.sleep)``."""
+        self._running = True
+        while self._running:
+            started = time.time()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Vitals hub emit error: {e}")
+            sleep_fn(max(0.0, self.interval - (time.time() - started)) or 0.01)
+
+    def stop(self):
+        self._running = False
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update({"devices": len(self._devices), "connections": len(self._sids),
+                          "pending_devices": len(self._pending), "ui_rate_hz": round(1.0 / self.interval, 2) if self.interval else None})
+        return stats
@@ -0,0 +1,123 @@
+# vitals_protocol.py
+"""
+Compact binary format for high-rate vitals, alongside the {'bpm', 'hrv'} dicts.
+
+A message is one or more records back to back. Each record is a 32-byte
+little-endian header followed by ``count`` fixed-size samples:
+
+    header   magic b"VT" | version u8 | kind u8 | device_id 16s (NUL padded)
+             | t0 f64 (unix seconds) | count u16 | reserved u16
+    KIND_VITALS samples:  offset_ms u32 | bpm f32 | hrv f32      (12 bytes)
+    KIND_IBI samples:     offset_ms u32 | ibi_ms u16             (6 bytes)
+
+Sample blocks are read with ``np.frombuffer`` straight into NumPy arrays, so a
+message with hundreds of samples costs a few array views, not a dict per
+field. Inter-beat intervals are reduced to one BPM/HRV (RMSSD) sample per record.
+"""
+import struct
+
+import numpy as np
+
+MAGIC = b"VT"
+VERSION = 1
+KIND_VITALS = 0
+KIND_IBI = 1
+
+HEADER = struct.Struct("<2sBB16sdHH")
+VITALS_DTYPE = np.dtype([("offset_ms", "<u4"), ("bpm", "<f4"), ("hrv", "<f4")])
+IBI_DTYPE = np.dtype([("offset_ms", "<u4"), ("ibi_ms", "<u2")])
+_DTYPES = {KIND_VITALS: VITALS_DTYPE, KIND_IBI: IBI_DTYPE}
+MAX_T0 = 32503680000.0                 # 3000-01-01; later timestamps cannot be stored as datetimes
+
+
+class ProtocolError(ValueError):
+    """Raised for malformed binary vitals messages."""
+
+
+class VitalsBatch:
+    """Decoded samples of one record: parallel arrays of timestamps, BPM and HRV."""
+
+    __slots__ = ("device_id", "ts", "bpm", "hrv")
+
+    def __init__(self, device_id, ts, bpm, hrv):
+        self.device_id = device_id
+        self.ts = ts
+        self.bpm = bpm
+        self.hrv = hrv
+
+    def __len__(self):
+        return len(self.ts)
+
+
+def _device_id(raw):
+    return raw.rstrip(b"\0").decode("ascii", "replace") or None
+
+
+def ibi_to_vitals(ibi_ms):
+    """(bpm, rmssd) for an array of inter-beat intervals in milliseconds."""
+    ibi = np.asarray(ibi_ms, dtype=np.float64)
+    ibi = ibi[ibi > 0]
+    if ibi.size == 0:
+        return 0.0, 0.0
+    bpm = 60000.0 / ibi.mean()
+    rmssd = float(np.sqrt(np.mean(np.diff(ibi) ** 2))) if ibi.size > 1 else 0.0
+    return float(bpm), rmssd
+
+
+def decode(buffer):
+    """Decode a binary message into a list of VitalsBatch (one per record)."""
+    view = memoryview(buffer)
+    batches = []
+    offset = 0
+    while offset < len(view):
+        if len(view) - offset < HEADER.size:
+            raise ProtocolError(f"truncated header at byte {offset}")
+        record_start = offset
+        magic, version, kind, device_raw, t0, count, _ = HEADER.unpack_from(view, offset)
+        if magic != MAGIC or version != VERSION:
+            raise ProtocolError(f"bad magic/version at byte {offset}")
+        dtype = _DTYPES.get(kind)
+        if dtype is None:
+            raise ProtocolError(f"unknown record kind {kind}")
+        offset += HEADER.size
+        end = offset + count * dtype.itemsize
+        if end > len(view):
+            raise ProtocolError(f"truncated samples at byte {offset}")
+        samples = np.frombuffer(view, dtype=dtype, count=count, offset=offset)
+        offset = end
+        if count == 0:
+            continue
+        if not 0.0 <= t0 <= MAX_T0:                     # also false for NaN
+            raise ProtocolError(f"timestamp {t0!r} out of range in record at byte {record_start}")
+        device_id = _device_id(device_raw)
+        if kind == KIND_VITALS:
+            if not (np.isfinite(samples["bpm"]).all() and np.isfinite(samples["hrv"]).all()):
+                raise ProtocolError(f"non-finite BPM/HRV in record at byte {record_start}")
+            ts = t0 + samples["offset_ms"] / 1000.0
+            batches.append(VitalsBatch(device_id, ts, samples["bpm"].astype(np.float64),
+                                       samples["hrv"].astype(np.float64)))
+        else:
+            bpm, hrv = ibi_to_vitals(samples["ibi_ms"])
+            ts = np.array([t0 + samples["offset_ms"][-1] / 1000.0])
+            batches.append(VitalsBatch(device_id, ts, np.array([bpm]), np.array([hrv])))
+    return batches
+
+
+def _header(kind, device_id, t0, count):
+    if count > 0xFFFF:
+        raise ProtocolError("too many samples for one record")
+    return HEADER.pack(MAGIC, VERSION, kind, (device_id or "").encode("ascii")[:16], float(t0), count, 0)
+
+
+def encode_vitals(device_id, t0, offsets_ms, bpm, hrv):
+    """One KIND_VITALS record; concatenate several records to batch devices."""
+    samples = np.empty(len(offsets_ms), dtype=VITALS_DTYPE)
+    samples["offset_ms"], samples["bpm"], samples["hrv"] = offsets_ms, bpm, hrv
+    return _header(KIND_VITALS, device_id, t0, len(samples)) + samples.tobytes()
+
+
+def encode_ibi(device_id, t0, offsets_ms, ibi_ms):
+    """One KIND_IBI record of raw inter-beat intervals."""
+    samples = np.empty(len(offsets_ms), dtype=IBI_DTYPE)
+    samples["offset_ms"], samples["ibi_ms"] = offsets_ms, ibi_ms
+    return _header(KIND_IBI, device_id, t0, len(samples)) + samples.tobytes()
@@ -0,0 +1,247 @@
+# vitals_store.py
+"""
+Write-behind persistence of hardware vitals in a MongoDB time-series collection.
+
+Samples are appended to an in-memory buffer and a background thread writes
+them with one ``insert_many`` per batch, either when ``max_batch`` samples are
+waiting or ``flush_interval`` seconds after the oldest one arrived. If Mongo
+falls behind and ``max_buffered`` samples are waiting, ``add()`` waits up to
+``block_timeout`` seconds for room and then drops the oldest sample, so a slow
+database never stalls the Socket.IO handlers or grows memory without bound.
+A batch whose write fails goes back to the front of the buffer and is retried
+with exponential backoff (up to ``max_backoff`` seconds), so a short outage
+costs nothing unless the buffer overflows.
+"""
+import time
+import threading
+from collections import deque
+from datetime import datetime, timezone
+
+import numpy as np
+from pymongo.errors import BulkWriteError, CollectionInvalid, OperationFailure, PyMongoError
+
+
+def ensure_vitals_collection(db, name="vitals", expire_after_seconds=None):
+    """Return the vitals collection, creating it as a time-series collection if needed."""
+    if name not in db.list_collection_names():
+        options = {"timeseries": {"timeField": "ts", "metaField": "meta", "granularity": "seconds"}}
+        if expire_after_seconds:
+            options["expireAfterSeconds"] = int(expire_after_seconds)
+        try:
+            db.create_collection(name, **options)
+        except CollectionInvalid:
+            pass  # created concurrently
+        except OperationFailure as e:
+            # MongoDB < 5.0 has no time-series collections; a plain collection still works
+            print(f"Time-series collection unavailable ({e}); using a regular collection for vitals.")
+            db[name].create_index([("meta.user_email", 1), ("meta.session_id", 1), ("ts", 1)])
+    return db[name]
+
+
+class VitalsWriter:
+    """Buffers vitals samples and writes them to Mongo in batches from a background thread."""
+
+    def __init__(self, collection, max_batch=500, flush_interval=2.0, max_buffered=20000, block_timeout=0.0,
+                 max_backoff=30.0):
+        self.collection = collection
+        self.max_batch = max(1, int(max_batch))
+        self.flush_interval = flush_interval
+        self.max_buffered = max(self.max_batch, int(max_buffered))
+        self.block_timeout = block_timeout
+        self.max_backoff = max_backoff
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._oldest_ts = None
+        self._failures = 0
+        self._retry_at = 0.0
+        self.stats = {"buffered": 0, "written": 0, "batches": 0, "dropped": 0, "errors": 0, "rejected": 0,
+                      "last_flush_ms": 0.0, "last_batch": 0}
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._flush_loop, name="vitals-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, flush=True, timeout=5.0):
+        """Stops the writer thread, writing whatever is still buffered first."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout)
+        self._thread = None
+        if flush:
+            while self._write_batch():
+                pass
+
+    def add(self, user_email, device_id, session_id, bpm, hrv, ts=None):
+        """Queue one sample. Returns False if the buffer was full and a sample had to be dropped."""
+        ts = ts if ts is not None else time.time()
+        doc = {
+            "ts": datetime.fromtimestamp(ts, timezone.utc),
+            "meta": {"user_email": user_email, "device_id": device_id, "session_id": session_id},
+            "bpm": bpm,
+            "hrv": hrv,
+        }
+        accepted = True
+        with self._cond:
+            if len(self._buffer) >= self.max_buffered and self.block_timeout:
+                self._cond.notify_all()
+                self._cond.wait_for(lambda: len(self._buffer) < self.max_buffered, self.block_timeout)
+            if len(self._buffer) >= self.max_buffered:
+                self._buffer.popleft()
+                self.stats["dropped"] += 1
+                accepted = False
+            if not self._buffer:
+                self._oldest_ts = time.time()
+            self._buffer.append(doc)
+            self.stats["buffered"] = len(self._buffer)
+            if len(self._buffer) >= self.max_batch:
+                self._cond.notify_all()
+        return accepted
+
+    def add_many(self, user_email, device_id, session_id, ts, bpm, hrv):
+        """Queue parallel arrays of samples from one device. Returns False if any were dropped."""
+        accepted = True
+        for t, b, h in zip(ts.tolist(), bpm.tolist(), hrv.tolist()):
+            accepted = self.add(user_email, device_id, session_id, b, h, t) and accepted
+        return accepted
+
+    def get_stats(self):
+        with self._cond:
+            return dict(self.stats)
+
+    # --- internals ---
+    def _due(self):
+        if not self._buffer or time.time() < self._retry_at:
+            return False
+        return len(self._buffer) >= self.max_batch or time.time() - self._oldest_ts >= self.flush_interval
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while self._running and not self._due():
+                    wait = self.flush_interval
+                    if self._buffer:
+                        wait = max(0.01, self.flush_interval - (time.time() - self._oldest_ts),
+                                   self._retry_at - time.time())
+                    self._cond.wait(wait)
+                if not self._running:
+                    return
+            self._write_batch()
+
+    def _write_batch(self):
+        """Write up to ``max_batch`` buffered samples. Returns how many left the buffer (0 if the batch was requeued)."""
+        with self._cond:
+            count = min(self.max_batch, len(self._buffer))
+            batch = [self._buffer.popleft() for _ in range(count)]
+            self._oldest_ts = time.time() if self._buffer else None
+            self.stats["buffered"] = len(self._buffer)
+            self._cond.notify_all()            # wake producers waiting for room
+        if not batch:
+            return 0
+        started = time.perf_counter()
+        written = len(batch)
+        try:
+            self.collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            # The server answered: documents it rejected would be rejected again, the rest are stored.
+            # A duplicate _id means an earlier, seemingly failed attempt did store that sample.
+            rejected = [err for err in e.details.get("writeErrors", []) if err.get("code") != 11000]
+            written -= len(rejected)
+            with self._cond:
+                self.stats["rejected"] += len(rejected)
+            if rejected:
+                print(f"Vitals writer: {len(rejected)} of {len(batch)} samples rejected: {rejected[0].get('errmsg')}")
+        except PyMongoError as e:
+            self._requeue(batch)
+            print(f"Vitals writer: insert_many of {len(batch)} samples failed, retrying in "
+                  f"{self._retry_at - time.time():.1f}s: {e}")
+            return 0
+        with self._cond:
+            self._failures = 0
+            self._retry_at = 0.0
+            self.stats["written"] += written
+            self.stats["batches"] += 1
+            self.stats["last_batch"] = len(batch)
+            self.stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000.0, 2)
+        return len(batch)
+
+    def _requeue(self, batch):
+        """Put a failed batch back in front of the buffer (dropping the oldest on overflow) and back off."""
+        with self._cond:
+            self.stats["errors"] += 1
+            self._failures += 1
+            self._retry_at = time.time() + min(self.max_backoff, self.flush_interval * 2 ** (self._failures - 1))
+            self._buffer.extendleft(reversed(batch))
+            while len(self._buffer) > self.max_buffered:
+                self._buffer.popleft()
+                self.stats["dropped"] += 1
+            if self._oldest_ts is None:
+                self._oldest_ts = time.time()
+            self.stats["buffered"] = len(self._buffer)
+
+
+def vitals_sessions(collection, user_email, limit=20):
+    """Most recent hardware sessions of a user with their time span and sample count."""
+    pipeline = [
+        {"$match": {"meta.user_email": user_email}},
+        {"$group": {"_id": "$meta.session_id", "device_id": {"$first": "$meta.device_id"},
+                    "start": {"$min": "$ts"}, "end": {"$max": "$ts"}, "samples": {"$sum": 1}}},
+        {"$sort": {"start": -1}},
+        {"$limit": int(limit)},
+    ]
+    return [
+        {"session_id": s["_id"], "device_id": s["device_id"], "start": s["start"].isoformat(),
+         "end": s["end"].isoformat(), "samples": s["samples"]}
+        for s in collection.aggregate(pipeline)
+    ]
+
+
+def downsampled_vitals(collection, user_email, session_id, bucket_seconds=10, start=None, end=None):
+    """BPM/HRV of one session averaged into ``bucket_seconds`` buckets, oldest first."""
+    match = {"meta.user_email": user_email, "meta.session_id": session_id}
+    if start or end:
+        match["ts"] = {}
+        if start:
+            match["ts"]["$gte"] = start
+        if end:
+            match["ts"]["$lt"] = end
+    bucket_ms = max(1, int(bucket_seconds * 1000))
+    ts_ms = {"$toLong": "$ts"}
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {"$subtract": [ts_ms, {"$mod": [ts_ms, bucket_ms]}]},
+            "bpm": {"$avg": "$bpm"}, "hrv": {"$avg": "$hrv"},
+            "bpm_min": {"$min": "$bpm"}, "bpm_max": {"$max": "$bpm"},
+            "samples": {"$sum": 1},
+        }},
+        {"$sort": {"_id": 1}},
+    ]
+    return [
+        {"t": b["_id"] / 1000.0,
+         "bpm": round(b["bpm"], 1) if b["bpm"] is not None else None,
+         "hrv": round(b["hrv"], 1) if b["hrv"] is not None else None,
+         "bpm_min": b["bpm_min"], "bpm_max": b["bpm_max"], "samples": b["samples"]}
+        for b in collection.aggregate(pipeline)
+    ]
+
+
+def session_samples(collection, user_email, session_id):
+    """All samples of one session as (ts seconds, bpm, hrv) float arrays, oldest first."""
+    cursor = collection.find(
+        {"meta.user_email": user_email, "meta.session_id": session_id},
+        {"_id": 0, "ts": 1, "bpm": 1, "hrv": 1},
+    ).sort("ts", 1)
+    rows = [(d["ts"].replace(tzinfo=timezone.utc).timestamp(), d.get("bpm") or 0, d.get("hrv") or 0) for d in cursor]
+    if not rows:
+        empty = np.empty(0, dtype=np.float64)
+        return empty, empty, empty
+    data = np.array(rows, dtype=np.float64)
+    return data[:, 0], data[:, 1], data[:, 2]